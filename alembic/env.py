@@ -3,7 +3,7 @@ from logging.config import fileConfig
 from alembic import context
 from sqlalchemy import engine_from_config, pool
 
-from noogle.db import engine
+from noogle.db import get_engine
 from noogle.models import Base
 
 # this is the Alembic Config object, which provides
@@ -27,7 +27,7 @@ target_metadata = Base.metadata
 
 # this will overwrite the ini-file sqlalchemy.url path
 # with the path given in the config of the main code
-config.set_main_option("sqlalchemy.url", str(engine.url))
+config.set_main_option("sqlalchemy.url", str(get_engine().url))
 
 
 def process_revision_directives(context, revision, directives):
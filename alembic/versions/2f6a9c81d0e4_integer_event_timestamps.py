@@ -0,0 +1,143 @@
+"""integer event timestamps
+
+Revision ID: 2f6a9c81d0e4
+Revises: 8b3e2d417c6a
+Create Date: 2026-10-18 10:41:09.226871
+
+"""
+from alembic import op
+import arrow
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision = "2f6a9c81d0e4"
+down_revision = "8b3e2d417c6a"
+branch_labels = None
+depends_on = None
+
+# The ArrowType columns held naive UTC datetimes, so the original timezone
+# of existing rows is unknown.
+BACKFILL_TZ = "+00:00"
+
+
+def _events(*columns):
+    return sa.table("events", sa.column("id", sa.Integer), *columns)
+
+
+def upgrade():
+    with op.batch_alter_table(
+        "events", table_kwargs={"sqlite_autoincrement": True}
+    ) as batch_op:
+        batch_op.add_column(sa.Column("scheduled_at", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("scheduled_tz", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("actioned_at", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("actioned_tz", sa.String(), nullable=True))
+
+    connection = op.get_bind()
+    old = _events(
+        sa.column("scheduled_date", sqlalchemy_utils.types.arrow.ArrowType),
+        sa.column("actioned_date", sqlalchemy_utils.types.arrow.ArrowType),
+    )
+    new = _events(
+        sa.column("scheduled_at", sa.Integer),
+        sa.column("scheduled_tz", sa.String),
+        sa.column("actioned_at", sa.Integer),
+        sa.column("actioned_tz", sa.String),
+    )
+
+    for row in connection.execute(sa.select(old)).fetchall():
+        values = {}
+        for prefix, value in (
+            ("scheduled", row.scheduled_date),
+            ("actioned", row.actioned_date),
+        ):
+            if value is not None:
+                values[f"{prefix}_at"] = arrow.get(value).int_timestamp
+                values[f"{prefix}_tz"] = BACKFILL_TZ
+
+        if values:
+            connection.execute(
+                new.update().where(new.c.id == row.id).values(**values)
+            )
+
+    with op.batch_alter_table(
+        "events", table_kwargs={"sqlite_autoincrement": True}
+    ) as batch_op:
+        batch_op.drop_index("ix_events_scheduled_date")
+        batch_op.drop_index("ix_events_state_scheduled_date")
+        batch_op.drop_constraint("event_id__date__cal__uc", type_="unique")
+        batch_op.drop_column("scheduled_date")
+        batch_op.drop_column("actioned_date")
+        batch_op.create_unique_constraint(
+            "event_id__date__cal__uc", ["event_id", "scheduled_at", "calendar_id"]
+        )
+        batch_op.create_index(
+            "ix_events_state_scheduled_at", ["state", "scheduled_at"], unique=False
+        )
+        batch_op.create_index("ix_events_scheduled_at", ["scheduled_at"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table(
+        "events", table_kwargs={"sqlite_autoincrement": True}
+    ) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "scheduled_date",
+                sqlalchemy_utils.types.arrow.ArrowType(),
+                nullable=True,
+            )
+        )
+        batch_op.add_column(
+            sa.Column(
+                "actioned_date",
+                sqlalchemy_utils.types.arrow.ArrowType(),
+                nullable=True,
+            )
+        )
+
+    connection = op.get_bind()
+    old = _events(
+        sa.column("scheduled_at", sa.Integer),
+        sa.column("scheduled_tz", sa.String),
+        sa.column("actioned_at", sa.Integer),
+        sa.column("actioned_tz", sa.String),
+    )
+    new = _events(
+        sa.column("scheduled_date", sqlalchemy_utils.types.arrow.ArrowType),
+        sa.column("actioned_date", sqlalchemy_utils.types.arrow.ArrowType),
+    )
+
+    for row in connection.execute(sa.select(old)).fetchall():
+        values = {}
+        if row.scheduled_at is not None:
+            values["scheduled_date"] = arrow.get(row.scheduled_at)
+        if row.actioned_at is not None:
+            values["actioned_date"] = arrow.get(row.actioned_at)
+
+        if values:
+            connection.execute(
+                new.update().where(new.c.id == row.id).values(**values)
+            )
+
+    with op.batch_alter_table(
+        "events", table_kwargs={"sqlite_autoincrement": True}
+    ) as batch_op:
+        batch_op.drop_index("ix_events_scheduled_at")
+        batch_op.drop_index("ix_events_state_scheduled_at")
+        batch_op.drop_constraint("event_id__date__cal__uc", type_="unique")
+        batch_op.drop_column("scheduled_at")
+        batch_op.drop_column("scheduled_tz")
+        batch_op.drop_column("actioned_at")
+        batch_op.drop_column("actioned_tz")
+        batch_op.create_unique_constraint(
+            "event_id__date__cal__uc", ["event_id", "scheduled_date", "calendar_id"]
+        )
+        batch_op.create_index(
+            "ix_events_state_scheduled_date", ["state", "scheduled_date"], unique=False
+        )
+        batch_op.create_index(
+            "ix_events_scheduled_date", ["scheduled_date"], unique=False
+        )
@@ -0,0 +1,26 @@
+"""calendar sync window
+
+Revision ID: 3a7f5c9e2b18
+Revises: e5d2a8c41f70
+Create Date: 2026-10-18 15:42:07.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3a7f5c9e2b18"
+down_revision = "e5d2a8c41f70"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("calendar_sync") as batch_op:
+        batch_op.add_column(sa.Column("window_end", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("calendar_sync") as batch_op:
+        batch_op.drop_column("window_end")
@@ -0,0 +1,32 @@
+"""thermostat snapshot
+
+Revision ID: 4e9b7a2c5d13
+Revises: 7d41c5e3b8f2
+Create Date: 2026-10-18 11:52:37.104518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "4e9b7a2c5d13"
+down_revision = "7d41c5e3b8f2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("thermostats") as batch_op:
+        batch_op.add_column(sa.Column("mode", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("eco", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("setpoint_c", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("fetched_at", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("thermostats") as batch_op:
+        batch_op.drop_column("fetched_at")
+        batch_op.drop_column("setpoint_c")
+        batch_op.drop_column("eco")
+        batch_op.drop_column("mode")
@@ -0,0 +1,48 @@
+"""unique structures and thermostats
+
+Revision ID: 7d41c5e3b8f2
+Revises: 2f6a9c81d0e4
+Create Date: 2026-10-18 11:20:54.730219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7d41c5e3b8f2"
+down_revision = "2f6a9c81d0e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Repeated loads used to add duplicate rows; keep the oldest of each.
+    op.execute(
+        "DELETE FROM structures WHERE id NOT IN "
+        "(SELECT MIN(id) FROM structures GROUP BY name)"
+    )
+    op.execute(
+        "DELETE FROM thermostats WHERE id NOT IN "
+        "(SELECT MIN(id) FROM thermostats GROUP BY name, structure_name)"
+    )
+
+    op.create_index("ix_structures_name", "structures", ["name"], unique=True)
+    op.drop_index("ix_thermostats_name_structure_name", table_name="thermostats")
+    op.create_index(
+        "ix_thermostats_name_structure_name",
+        "thermostats",
+        ["name", "structure_name"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_thermostats_name_structure_name", table_name="thermostats")
+    op.create_index(
+        "ix_thermostats_name_structure_name",
+        "thermostats",
+        ["name", "structure_name"],
+        unique=False,
+    )
+    op.drop_index("ix_structures_name", table_name="structures")
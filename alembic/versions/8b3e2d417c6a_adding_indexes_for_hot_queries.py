@@ -0,0 +1,47 @@
+"""adding indexes for hot queries
+
+Revision ID: 8b3e2d417c6a
+Revises: 5c1f0e7b2a9d
+Create Date: 2026-10-18 10:02:47.918553
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8b3e2d417c6a"
+down_revision = "5c1f0e7b2a9d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_events_state_scheduled_date",
+        "events",
+        ["state", "scheduled_date"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_events_scheduled_date", "events", ["scheduled_date"], unique=False
+    )
+    op.create_index(
+        "ix_thermostats_name_structure_name",
+        "thermostats",
+        ["name", "structure_name"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_structures_custom_name_lower",
+        "structures",
+        [sa.text("lower(custom_name)")],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_structures_custom_name_lower", table_name="structures")
+    op.drop_index("ix_thermostats_name_structure_name", table_name="thermostats")
+    op.drop_index("ix_events_scheduled_date", table_name="events")
+    op.drop_index("ix_events_state_scheduled_date", table_name="events")
@@ -0,0 +1,30 @@
+"""convergence times
+
+Revision ID: 9c2e4f7a1d35
+Revises: 3a7f5c9e2b18
+Create Date: 2026-10-18 17:26:41.208593
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9c2e4f7a1d35"
+down_revision = "3a7f5c9e2b18"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "convergence_times",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("seconds", sa.Float(), nullable=False),
+        sa.Column("recorded_at", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("convergence_times")
@@ -0,0 +1,34 @@
+"""calendar watch channel
+
+Revision ID: b81c3f6e9a27
+Revises: 4e9b7a2c5d13
+Create Date: 2026-10-18 12:14:48.551206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b81c3f6e9a27"
+down_revision = "4e9b7a2c5d13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("calendar_sync") as batch_op:
+        batch_op.add_column(sa.Column("channel_id", sa.String(), nullable=True))
+        batch_op.add_column(
+            sa.Column("channel_resource_id", sa.String(), nullable=True)
+        )
+        batch_op.add_column(
+            sa.Column("channel_expires_at", sa.Integer(), nullable=True)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("calendar_sync") as batch_op:
+        batch_op.drop_column("channel_expires_at")
+        batch_op.drop_column("channel_resource_id")
+        batch_op.drop_column("channel_id")
@@ -0,0 +1,42 @@
+"""adding outbox
+
+Revision ID: e5d2a8c41f70
+Revises: b81c3f6e9a27
+Create Date: 2026-10-18 13:05:12.640937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5d2a8c41f70"
+down_revision = "b81c3f6e9a27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbox",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("subject", sa.String(), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("created_at", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.Integer(), nullable=False),
+        sa.Column("sent_at", sa.Integer(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_outbox_sent_at_next_attempt_at",
+        "outbox",
+        ["sent_at", "next_attempt_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_outbox_sent_at_next_attempt_at", table_name="outbox")
+    op.drop_table("outbox")
@@ -0,0 +1,6 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for noogle.  Run them from the repository root, e.g.
+``python -m benchmarks.startup check``.
+"""
@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module holds the benchmarks for the queries on the ``events`` table,
+and the service checks built on them, at different table sizes.
+
+For each size, a sandbox database is seeded with that many events (one an
+hour, centered on now) and the fake calendar is given the waiting events in
+the sync window, less a tenth that were "removed" and plus a tenth that are
+new.  Each benchmark reports its time per call and the number of SQL
+statements per call:
+
+    python -m benchmarks.events run      # print the results
+    python -m benchmarks.events record   # save them as the baseline
+    python -m benchmarks.events check    # fail if they've regressed
+
+Any increase in the number of statements is a regression; timings only
+compare on the machine they were recorded on.
+"""
+# Imports #####################################################################
+import functools
+import logging
+import statistics
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+import arrow
+import click
+from sqlalchemy import event
+
+from noogle.cli import Ctx
+from noogle.cli.service import check_gcal, check_nest
+from noogle.db import get_engine, session
+from noogle.gcal import sync_window
+from noogle.models import Event, State
+from noogle.nest import AsyncNestAPI
+from noogle.utils import get_scheduled_date, to_timestamp
+
+from .results import (
+    describe,
+    load,
+    new_results,
+    regressed,
+    report_regressions,
+    save,
+    warn_if_incomparable,
+)
+from .sandbox import Sandbox
+from .stubs import FakeCalendar, FakeSDM, install
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+# Globals #####################################################################
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "events.json"
+
+SIZES = [1000, 10000, 100000]
+
+
+class StatementCounter:
+    """
+    Counts the SQL statements sent to the database.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self) -> "StatementCounter":
+        event.listen(get_engine(), "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(get_engine(), "before_cursor_execute", self)
+
+
+@dataclass
+class Fixture:
+    """
+    What the benchmarks run against for one table size.
+    """
+
+    sandbox: Sandbox
+    sdm: FakeSDM
+    calendar: FakeCalendar
+
+    @property
+    def gcal_event(self) -> dict:
+        """
+        An event that's cached and still in the calendar.
+        """
+        return self.calendar.items[0]
+
+    @functools.cached_property
+    def gcal_keys(self) -> List[tuple]:
+        """
+        The ``(event_id, scheduled_at)`` pairs of the calendar's events.
+        """
+        return [
+            (e["id"], to_timestamp(get_scheduled_date(e))) for e in self.calendar.items
+        ]
+
+
+@dataclass
+class Benchmark:
+    name: str
+    func: Callable[[Fixture], Any]
+    # Calls per timed sample, for the ones too quick to time one at a time.
+    number: int = 1
+    # Restore the database before each sample, for the ones that change it.
+    restore: bool = False
+
+
+def _exists(fixture: Fixture):
+    gcal_event = fixture.gcal_event
+    Event.exists(gcal_event["id"], arrow.get(gcal_event["start"]["dateTime"]))
+
+
+BENCHMARKS = {
+    b.name: b
+    for b in [
+        Benchmark(
+            "Event.create_from_gcal",
+            lambda f: Event.create_from_gcal(f.gcal_event, commit=False),
+            number=100,
+        ),
+        Benchmark("Event.exists", _exists, number=100),
+        Benchmark(
+            "Event.events_missing",
+            lambda f: Event.events_missing(f.gcal_keys, *sync_window()),
+        ),
+        Benchmark("Event.waiting", lambda f: Event.waiting()),
+        Benchmark("check_gcal", lambda f: check_gcal(incremental=False), restore=True),
+        Benchmark("check_nest", lambda f: check_nest(), restore=True),
+    ]
+}
+
+
+def calendar_items(now: int) -> List[dict]:
+    """
+    Returns the calendar for the seeded events: the waiting ones in the sync
+    window, less every tenth one, plus a tenth as many new ones.  The last
+    cached event before the window is included too, as Google returns events
+    that started before ``timeMin`` but haven't ended.
+    """
+    window_start, window_end = sync_window()
+    cached = (
+        session.query(Event)
+        .filter(
+            Event.state == State.waiting,
+            Event.scheduled_at >= to_timestamp(window_start),
+            Event.scheduled_at <= to_timestamp(window_end),
+        )
+        .order_by(Event.scheduled_at)
+        .all()
+    )
+    ongoing = (
+        session.query(Event)
+        .filter(Event.scheduled_at < to_timestamp(window_start))
+        .order_by(Event.scheduled_at.desc())
+        .first()
+    )
+
+    def item(event_id: str, name: str, scheduled_at: int) -> dict:
+        return {
+            "id": event_id,
+            "summary": name,
+            "status": "confirmed",
+            "start": {"dateTime": arrow.get(scheduled_at).isoformat()},
+        }
+
+    items = [
+        item(e.event_id, e.name, e.scheduled_at)
+        for i, e in enumerate(cached)
+        if i % 10 != 9
+    ]
+    if ongoing:
+        items.append(item(ongoing.event_id, ongoing.name, ongoing.scheduled_at))
+    items += [
+        item(f"new{i}", f"nest:home:new event {i}", now + 30 * 60 + i * 60 * 60)
+        for i in range(len(cached) // 10)
+    ]
+
+    session.remove()
+    return items
+
+
+def _reset(fixture: Fixture, benchmark: Benchmark):
+    session.remove()
+    if benchmark.restore:
+        fixture.sandbox.restore()
+
+    # Start each check from a cold process, as far as Nest is concerned.
+    fixture.sdm.reset()
+    AsyncNestAPI._snapshot = {}
+    AsyncNestAPI._enterprise_limiter = AsyncNestAPI._device_limiter = None
+    AsyncNestAPI._convergence_times.clear()
+
+
+def measure(fixture: Fixture, benchmark: Benchmark, repeat: int) -> dict:
+    """
+    Returns the time and number of statements per call of ``benchmark``,
+    over ``repeat`` samples (after one to warm up).
+    """
+    times = []
+    statements = []
+
+    for sample in range(repeat + 1):
+        _reset(fixture, benchmark)
+
+        with StatementCounter() as counter:
+            start = time.perf_counter()
+            for _ in range(benchmark.number):
+                benchmark.func(fixture)
+            elapsed = time.perf_counter() - start
+
+        if sample:
+            times.append(elapsed * 1000 / benchmark.number)
+            statements.append(counter.count / benchmark.number)
+
+    session.remove()
+    return {
+        "ms": {
+            "median": round(statistics.median(times), 3),
+            "min": round(min(times), 3),
+            "max": round(max(times), 3),
+        },
+        "statements": max(statements),
+    }
+
+
+def run_size(size: int, benchmarks: Sequence[Benchmark], repeat: int) -> dict:
+    results = {}
+
+    with Sandbox.create() as sandbox:
+        sandbox.activate()
+        sandbox.init_db()
+        now = sandbox.seed_events(size, due=1)
+
+        sdm, _, calendar = install(calendar=FakeCalendar(calendar_items(now)))
+        sandbox.save_template()
+        fixture = Fixture(sandbox=sandbox, sdm=sdm, calendar=calendar)
+
+        for benchmark in benchmarks:
+            click.echo(f"running {benchmark.name} ({size} events)...", err=True)
+            results[benchmark.name] = measure(fixture, benchmark, repeat)
+
+    return results
+
+
+def run_suite(repeat: int, sizes: Sequence[int] = (), names: Sequence[str] = ()):
+    """
+    Runs the benchmarks named in ``names`` at each of ``sizes`` (default:
+    all of them).
+    """
+    benchmarks = [BENCHMARKS[name] for name in (names or BENCHMARKS)]
+    results = new_results(repeat)
+    results["sizes"] = {}
+
+    # The services only report errors in quiet mode; keep the rest of the
+    # logging out of the way too.
+    ctx = click.Context(click.Command("benchmark"), obj=Ctx())
+    ctx.obj.quiet = True
+    logging.disable(logging.WARNING)
+
+    try:
+        with ctx:
+            for size in sizes or SIZES:
+                results["sizes"][str(size)] = run_size(size, benchmarks, repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return results
+
+
+def compare(
+    baseline: dict, results: dict, threshold: float, min_delta_ms: float
+) -> List[str]:
+    """
+    Returns a description of each regression in ``results``: more statements
+    per call than in ``baseline``, or a time per call more than
+    ``threshold`` (a fraction) and ``min_delta_ms`` slower.
+    """
+    regressions = []
+    for size, benchmarks in results["sizes"].items():
+        for name, after in benchmarks.items():
+            before = baseline["sizes"].get(size, {}).get(name)
+            if before is None:
+                click.echo(f"{name} ({size} events): not in the baseline", err=True)
+                continue
+
+            label = f"{name} ({size} events)"
+            if after["statements"] > before["statements"]:
+                regressions.append(
+                    describe(
+                        f"{label} statements",
+                        before["statements"],
+                        after["statements"],
+                        unit="",
+                    )
+                )
+
+            ms_before = before["ms"]["median"]
+            ms_after = after["ms"]["median"]
+            if regressed(ms_before, ms_after, threshold, min_delta_ms):
+                regressions.append(describe(label, ms_before, ms_after))
+
+    return regressions
+
+
+def print_report(results: dict):
+    click.echo(
+        f"\n{'benchmark':<24} {'events':>8} {'median':>11} {'min':>11} "
+        f"{'statements':>11}"
+    )
+
+    rows: Dict[str, List[str]] = {}
+    for size, benchmarks in results["sizes"].items():
+        for name, result in benchmarks.items():
+            rows.setdefault(name, []).append(
+                f"{name:<24} {int(size):>8} {result['ms']['median']:>9.3f}ms "
+                f"{result['ms']['min']:>9.3f}ms {result['statements']:>11g}"
+            )
+
+    for lines in rows.values():
+        click.echo("\n".join(lines))
+
+
+def suite_options(func):
+    func = click.option(
+        "--benchmark",
+        "-b",
+        "names",
+        multiple=True,
+        type=click.Choice(list(BENCHMARKS)),
+        help="Only run this benchmark (may be repeated) [default: all]",
+    )(func)
+    func = click.option(
+        "--size",
+        "-S",
+        "sizes",
+        multiple=True,
+        type=click.Choice([str(s) for s in SIZES]),
+        help="Only use this many events (may be repeated) [default: all]",
+    )(func)
+    func = click.option(
+        "--repeat",
+        "-n",
+        default=5,
+        show_default=True,
+        help="Number of timed samples per benchmark",
+    )(func)
+    return func
+
+
+@click.group()
+def cli():
+    """Measure the event queries as the events table grows"""
+
+
+@cli.command()
+@suite_options
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Also save the results to this file",
+)
+def run(repeat, sizes, names, output):
+    """Run the benchmarks and print the results"""
+    results = run_suite(repeat, [int(s) for s in sizes], names)
+    print_report(results)
+
+    if output:
+        save(results, output)
+
+
+@cli.command()
+@suite_options
+@click.option(
+    "--baseline",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=DEFAULT_BASELINE,
+    show_default=True,
+)
+def record(repeat, sizes, names, baseline):
+    """Run the benchmarks and save them as the baseline"""
+    results = run_suite(repeat, [int(s) for s in sizes], names)
+    print_report(results)
+    save(results, baseline)
+
+
+@cli.command()
+@suite_options
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=DEFAULT_BASELINE,
+    show_default=True,
+)
+@click.option(
+    "--results",
+    "results_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Check these saved results instead of running the benchmarks",
+)
+@click.option(
+    "--threshold",
+    default=0.5,
+    show_default=True,
+    help="Allowed slowdown, as a fraction of the baseline",
+)
+@click.option(
+    "--min-delta",
+    default=1.0,
+    show_default=True,
+    help="Ignore slowdowns smaller than this many milliseconds",
+)
+def check(repeat, sizes, names, baseline, results_path, threshold, min_delta):
+    """Fail if the queries have regressed from the baseline"""
+    before = load(baseline)
+    if results_path:
+        results = load(results_path)
+    else:
+        results = run_suite(repeat, [int(s) for s in sizes], names)
+        print_report(results)
+
+    warn_if_incomparable(before, results)
+    report_regressions(compare(before, results, threshold, min_delta))
+
+
+if __name__ == "__main__":
+    cli()
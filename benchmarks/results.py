@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module holds the helpers shared by the benchmark suites for saving
+results and comparing them with a baseline.
+"""
+# Imports #####################################################################
+import json
+import platform
+from datetime import datetime, timezone
+from pathlib import Path
+
+import click
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+
+def new_results(repeat: int) -> dict:
+    """
+    Returns the results header: when and where the benchmarks were run.
+    """
+    return {
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+    }
+
+
+def load(path: Path) -> dict:
+    return json.loads(path.read_text())
+
+
+def save(results: dict, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2) + "\n")
+    click.echo(f"saved {path}", err=True)
+
+
+def regressed(before: float, after: float, threshold: float, min_delta: float) -> bool:
+    """
+    Returns `True` if ``after`` is more than ``threshold`` (a fraction) and
+    ``min_delta`` worse than ``before``.
+    """
+    return (after > before * (1 + threshold)) and (after - before > min_delta)
+
+
+def describe(name: str, before: float, after: float, unit: str = "ms") -> str:
+    change = f"+{(after / before - 1):.0%}" if before else "new"
+    return f"{name}: {before:.1f}{unit} -> {after:.1f}{unit} ({change})"
+
+
+def warn_if_incomparable(baseline: dict, results: dict):
+    if baseline.get("python") != results.get("python"):
+        click.echo(
+            f"WARNING: the baseline was recorded with Python {baseline.get('python')}",
+            err=True,
+        )
+
+
+def report_regressions(regressions):
+    """
+    Prints ``regressions`` and exits with 1 if there are any.
+    """
+    if regressions:
+        click.echo("\nRegressions:", err=True)
+        for regression in regressions:
+            click.echo(f"  {regression}", err=True)
+        raise SystemExit(1)
+
+    click.echo("\nNo regressions", err=True)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module holds a throwaway noogle configuration (settings, token files
+and a SQLite database) for the benchmarks, so they never touch the real
+ones.
+"""
+# Imports #####################################################################
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+# Globals #####################################################################
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+ENV_TEMPLATE = """\
+NOOGLE_GENERAL__BASE_CONFIG_FOLDER={root}
+NOOGLE_GENERAL__TOKEN_FOLDER={token_folder}
+
+NOOGLE_LOGGING__USE_LOGFILE=False
+
+NOOGLE_NEST__STRUCTURE=Home
+NOOGLE_NEST__PRODUCT_ID=bench
+NOOGLE_NEST__TOKEN_FILE={token_folder}/nest-oauth-client-secret.json
+NOOGLE_NEST__CONVERGENCE_INITIAL_DELAY=0
+
+NOOGLE_CALENDAR__TIMEZONE=MST
+NOOGLE_CALENDAR__TOKEN_FILE={token_folder}/calendar-oauth-client-secret.json
+
+NOOGLE_MAILGUN__API_KEY=bench
+NOOGLE_MAILGUN__DOMAIN_NAME=bench.invalid
+NOOGLE_MAILGUN__FROM_ADDRESS=noogle@bench.invalid
+NOOGLE_MAILGUN__TO_ADDRESS=user@bench.invalid
+
+NOOGLE_DATABASE__URI=sqlite:///{db_path}
+"""
+
+# Written as the cached access tokens so nothing tries to sign in; the
+# network stubs make sure they're never used.
+FAKE_TOKEN = {
+    "token": "bench",
+    "refresh_token": "bench",
+    "client_id": "bench",
+    "client_secret": "bench",
+}
+
+SEED_BATCH_SIZE = 10000
+
+
+class Sandbox:
+    """
+    A noogle configuration in ``root``.  Use `create` for a new one in a
+    temporary folder; it's removed when used as a context manager.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.token_folder = root / "tokens"
+        self.env_file = root / ".env"
+        self.db_path = root / "noogle.sqlite3"
+        self.template_path = root / "template.sqlite3"
+
+    @classmethod
+    def create(cls, root: Optional[Path] = None) -> "Sandbox":
+        sandbox = cls(Path(root or tempfile.mkdtemp(prefix="noogle-bench-")))
+        sandbox.token_folder.mkdir(parents=True, exist_ok=True)
+
+        for name in ["nest", "calendar"]:
+            (sandbox.token_folder / f"{name}-oauth-client-secret.json").write_text("{}")
+            (sandbox.token_folder / f"tmp-{name}-access-token.json").write_text(
+                json.dumps(FAKE_TOKEN)
+            )
+
+        sandbox.env_file.write_text(
+            ENV_TEMPLATE.format(
+                root=sandbox.root,
+                token_folder=sandbox.token_folder,
+                db_path=sandbox.db_path,
+            )
+        )
+        return sandbox
+
+    def __enter__(self) -> "Sandbox":
+        return self
+
+    def __exit__(self, *args):
+        self.cleanup()
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @property
+    def uri(self) -> str:
+        return f"sqlite:///{self.db_path}"
+
+    def environ(self) -> Dict[str, str]:
+        """
+        Returns the environment for running noogle in the sandbox; any
+        ``NOOGLE_*`` variables of our own are dropped so they can't override
+        it.
+        """
+        env = {
+            k: v for k, v in os.environ.items() if not k.upper().startswith("NOOGLE_")
+        }
+        env["NOOGLE_ENV"] = str(self.env_file)
+
+        paths = [str(REPO_ROOT)] + [p for p in [env.get("PYTHONPATH")] if p]
+        env["PYTHONPATH"] = os.pathsep.join(paths)
+        return env
+
+    def activate(self):
+        """
+        Points this process's noogle at the sandbox.
+        """
+        if str(REPO_ROOT) not in sys.path:
+            sys.path.insert(0, str(REPO_ROOT))
+
+        from noogle import db, settings
+
+        settings.configure(_env_file=self.env_file)
+        db.configure(self.uri)
+
+    def init_db(self):
+        """
+        Creates an empty database.  The sandbox must be active.
+        """
+        from noogle import db
+
+        db.init()
+
+    def seed_events(
+        self,
+        count: int,
+        due: int = 0,
+        spacing: int = 60 * 60,
+        now: Optional[int] = None,
+    ) -> int:
+        """
+        Adds ``count`` events, ``spacing`` seconds apart and centered on
+        ``now``; the past ones are complete and the rest are waiting.  A
+        further ``due`` waiting "away" events are scheduled in the last few
+        minutes so the Nest service has something to do.  The sandbox must be active.
+
+        Returns the epoch time the events are centered on.
+        """
+        from noogle.db import session
+        from noogle.models import Action, Event, State
+
+        now = now or int(time.time())
+        start = now - (count // 2) * spacing
+        table = Event.__table__
+
+        def row(i: int, scheduled_at: int, state: State, action: Action) -> dict:
+            return {
+                "event_id": f"bench{i}",
+                "name": f"nest:{action.name}:benchmark event {i}",
+                "action": action,
+                "calendar_id": "primary",
+                "state": state,
+                "scheduled_at": scheduled_at,
+                "scheduled_tz": "UTC",
+                "actioned_at": scheduled_at if state == State.complete else None,
+                "actioned_tz": "UTC" if state == State.complete else None,
+            }
+
+        rows = []
+        for i in range(count):
+            scheduled_at = start + i * spacing
+            state = State.complete if scheduled_at <= now else State.waiting
+            action = Action.away if i % 2 else Action.home
+            rows.append(row(i, scheduled_at, state, action))
+
+            if len(rows) >= SEED_BATCH_SIZE:
+                session.execute(table.insert(), rows)
+                rows = []
+
+        for i in range(due):
+            scheduled_at = now - 60 * (due - i)
+            rows.append(row(count + i, scheduled_at, State.waiting, Action.away))
+
+        if rows:
+            session.execute(table.insert(), rows)
+
+        session.commit()
+        return now
+
+    def save_template(self):
+        """
+        Keeps a copy of the database for `restore`.
+        """
+        from noogle.db import session
+
+        session.remove()
+        shutil.copyfile(self.db_path, self.template_path)
+
+    def restore(self):
+        """
+        Puts the database back the way it was at `save_template`.
+        """
+        shutil.copyfile(self.template_path, self.db_path)
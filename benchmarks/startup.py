@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module holds the startup benchmarks.  noogle is mostly run as
+short-lived ``--once`` processes, so how long it takes to start matters
+more than how fast it is once it's up.
+
+Each scenario is run in a fresh interpreter against a sandbox (see
+`Sandbox`) with a seeded database.  We keep the wall time over several
+runs, and the import time of each module from ``python -X importtime``:
+
+    python -m benchmarks.startup run      # print the results
+    python -m benchmarks.startup record   # save them as the baseline
+    python -m benchmarks.startup check    # fail if they've regressed
+
+Timings only compare on the machine (and Python) they were recorded on, so
+record a baseline before making changes.
+"""
+# Imports #####################################################################
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import click
+
+from .results import (
+    describe,
+    load,
+    new_results,
+    regressed,
+    report_regressions,
+    save,
+    warn_if_incomparable,
+)
+from .sandbox import REPO_ROOT, Sandbox
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+# Globals #####################################################################
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "startup.json"
+
+# How many events are in the database; one more is due so `service nest`
+# has something to do.
+SEED_EVENTS = 1000
+
+# Modules that import faster than this aren't kept in the results.
+RECORD_FLOOR_US = 1000
+
+# e.g. "import time:       512 |       2048 |   noogle.cli"
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)")
+
+
+@dataclass
+class Scenario:
+    name: str
+    args: List[str]
+    # Run with the network stubbed out (see `benchmarks.stubs`).
+    stubbed: bool = False
+    # Text the output must contain, to make sure the run did its work.
+    expect: Optional[str] = None
+
+    @property
+    def command(self) -> List[str]:
+        module = "benchmarks.stubs" if self.stubbed else "noogle"
+        return ["-m", module] + self.args
+
+
+SCENARIOS = {
+    s.name: s
+    for s in [
+        Scenario("help", ["--help"], expect="Commands:"),
+        Scenario(
+            "service-nest-once",
+            ["service", "nest", "--once"],
+            stubbed=True,
+            expect="converged",
+        ),
+        Scenario("show-events", ["show", "events"], expect="benchmark event"),
+    ]
+}
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Returns the self and cumulative import time (in µs) of each module in the
+    output of ``-X importtime``.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            modules[match.group(3)] = (int(match.group(1)), int(match.group(2)))
+
+    return modules
+
+
+def run_once(
+    sandbox: Sandbox, scenario: Scenario, importtime: bool = False
+) -> Tuple[float, str]:
+    """
+    Runs ``scenario`` against a fresh copy of the sandbox database.  Returns
+    the wall time (in seconds) and the stderr.
+    """
+    sandbox.restore()
+
+    options = ["-X", "importtime"] if importtime else []
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable] + options + scenario.command,
+        cwd=REPO_ROOT,
+        env=sandbox.environ(),
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    if result.returncode:
+        raise click.ClickException(
+            f"{scenario.name} exited with {result.returncode}:\n{result.stderr[-2000:]}"
+        )
+    elif scenario.expect and (scenario.expect not in result.stdout + result.stderr):
+        raise click.ClickException(
+            f"{scenario.name} didn't print '{scenario.expect}':\n{result.stdout[-2000:]}"
+        )
+
+    return elapsed, result.stderr
+
+
+def measure(sandbox: Sandbox, scenario: Scenario, repeat: int) -> dict:
+    """
+    Returns the timings for ``scenario``: the wall time over ``repeat`` runs,
+    and the median import time of each module over another ``repeat`` runs
+    with ``-X importtime``.
+    """
+    # Warm up the bytecode and file system caches.
+    run_once(sandbox, scenario)
+
+    times = [run_once(sandbox, scenario)[0] * 1000 for _ in range(repeat)]
+
+    samples: Dict[str, List[Tuple[int, int]]] = {}
+    for _ in range(repeat):
+        _, stderr = run_once(sandbox, scenario, importtime=True)
+        for module, timing in parse_importtime(stderr).items():
+            samples.setdefault(module, []).append(timing)
+
+    modules = {}
+    for module, timings in samples.items():
+        cumulative_us = int(statistics.median(t[1] for t in timings))
+        if cumulative_us >= RECORD_FLOOR_US:
+            modules[module] = {
+                "self_us": int(statistics.median(t[0] for t in timings)),
+                "cumulative_us": cumulative_us,
+            }
+
+    return {
+        "args": scenario.args,
+        "stubbed": scenario.stubbed,
+        "wall_ms": {
+            "median": round(statistics.median(times), 1),
+            "min": round(min(times), 1),
+            "max": round(max(times), 1),
+        },
+        "modules": dict(
+            sorted(modules.items(), key=lambda m: m[1]["cumulative_us"], reverse=True)
+        ),
+    }
+
+
+def run_suite(repeat: int, names: Sequence[str] = ()) -> dict:
+    """
+    Runs the scenarios named in ``names`` (default: all of them).
+    """
+    scenarios = [SCENARIOS[name] for name in (names or SCENARIOS)]
+    results = new_results(repeat)
+    results["scenarios"] = {}
+
+    with Sandbox.create() as sandbox:
+        sandbox.activate()
+        sandbox.init_db()
+        sandbox.seed_events(SEED_EVENTS, due=1)
+        sandbox.save_template()
+
+        for scenario in scenarios:
+            click.echo(f"running {scenario.name}...", err=True)
+            results["scenarios"][scenario.name] = measure(sandbox, scenario, repeat)
+
+    return results
+
+
+def compare(
+    baseline: dict, results: dict, threshold: float, min_delta_ms: float
+) -> List[str]:
+    """
+    Returns a description of each regression in ``results``: a wall time or
+    module import time more than ``threshold`` (a fraction) and
+    ``min_delta_ms`` slower than in ``baseline``.  Modules that weren't in
+    the baseline count from zero.
+
+    Modules are compared on their own (self) import time; the cumulative
+    time moves to whichever module happens to import a dependency first, so
+    reordering imports would show up as a regression.  Anything else that
+    slows startup down shows up in the wall time.
+    """
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            click.echo(f"{name}: not in the baseline; skipped", err=True)
+            continue
+
+        wall_before = before["wall_ms"]["median"]
+        wall_after = scenario["wall_ms"]["median"]
+        if regressed(wall_before, wall_after, threshold, min_delta_ms):
+            regressions.append(describe(f"{name} wall time", wall_before, wall_after))
+
+        for module, timing in scenario["modules"].items():
+            module_before = before["modules"].get(module, {}).get("self_us", 0)
+            module_after = timing["self_us"]
+            if regressed(
+                module_before / 1000, module_after / 1000, threshold, min_delta_ms
+            ):
+                regressions.append(
+                    describe(
+                        f"{name} import {module}",
+                        module_before / 1000,
+                        module_after / 1000,
+                    )
+                )
+
+    return regressions
+
+
+def print_report(results: dict, top: int = 15):
+    for name, scenario in results["scenarios"].items():
+        wall = scenario["wall_ms"]
+        click.echo(
+            f"\n{name} ({' '.join(scenario['args'])}): "
+            f"median {wall['median']:.1f}ms, min {wall['min']:.1f}ms, "
+            f"max {wall['max']:.1f}ms"
+        )
+        click.echo(f"  {'cumulative':>10}  {'self':>8}  module")
+        for module, timing in list(scenario["modules"].items())[:top]:
+            click.echo(
+                f"  {timing['cumulative_us'] / 1000:>8.1f}ms  "
+                f"{timing['self_us'] / 1000:>6.1f}ms  {module}"
+            )
+
+
+def suite_options(func):
+    func = click.option(
+        "--scenario",
+        "-s",
+        "scenarios",
+        multiple=True,
+        type=click.Choice(list(SCENARIOS)),
+        help="Only run this scenario (may be repeated) [default: all]",
+    )(func)
+    func = click.option(
+        "--repeat",
+        "-n",
+        default=5,
+        show_default=True,
+        help="Number of timed runs per scenario",
+    )(func)
+    return func
+
+
+@click.group()
+def cli():
+    """Measure how long noogle takes to start"""
+
+
+@cli.command()
+@suite_options
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Also save the results to this file",
+)
+def run(repeat, scenarios, output):
+    """Run the benchmarks and print the results"""
+    results = run_suite(repeat, scenarios)
+    print_report(results)
+
+    if output:
+        save(results, output)
+
+
+@cli.command()
+@suite_options
+@click.option(
+    "--baseline",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=DEFAULT_BASELINE,
+    show_default=True,
+)
+def record(repeat, scenarios, baseline):
+    """Run the benchmarks and save them as the baseline"""
+    results = run_suite(repeat, scenarios)
+    print_report(results)
+    save(results, baseline)
+
+
+@cli.command()
+@suite_options
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=DEFAULT_BASELINE,
+    show_default=True,
+)
+@click.option(
+    "--results",
+    "results_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Check these saved results instead of running the benchmarks",
+)
+@click.option(
+    "--threshold",
+    default=0.5,
+    show_default=True,
+    help="Allowed slowdown, as a fraction of the baseline",
+)
+@click.option(
+    "--min-delta",
+    default=10.0,
+    show_default=True,
+    help="Ignore slowdowns smaller than this many milliseconds",
+)
+def check(repeat, scenarios, baseline, results_path, threshold, min_delta):
+    """Fail if startup has regressed from the baseline"""
+    before = load(baseline)
+    if results_path:
+        results = load(results_path)
+    else:
+        results = run_suite(repeat, scenarios)
+        print_report(results)
+
+    warn_if_incomparable(before, results)
+    report_regressions(compare(before, results, threshold, min_delta))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module stands in for the services noogle talks to (the Nest SDM API,
+Google sign-in, Google Calendar and Mailgun) so the benchmarks measure noogle rather than
+the network.
+
+``python -m benchmarks.stubs <arguments>`` runs the noogle CLI with the
+stubs.  They're patched in as each module is imported, so the import times
+aren't affected.
+"""
+# Imports #####################################################################
+import importlib.abc
+import importlib.util
+import json
+import runpy
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+# Globals #####################################################################
+ENTERPRISE = "enterprises/bench"
+STRUCTURE = f"{ENTERPRISE}/structures/home"
+
+
+class FakeCredentials:
+    token = "bench"
+
+
+class FakeSDM:
+    """
+    An SDM enterprise with one structure (``Home``) and ``thermostats``
+    thermostats.  Commands take effect immediately.
+    """
+
+    def __init__(self, thermostats: int = 2):
+        self.thermostats = thermostats
+        self.reset()
+
+    def reset(self):
+        """
+        Puts the thermostats back in "home" mode.
+        """
+        self.devices = {
+            f"{ENTERPRISE}/devices/t{i}": {
+                "label": f"Thermostat {i}",
+                "mode": "HEAT",
+                "eco": "OFF",
+                "heatCelsius": 20.0,
+            }
+            for i in range(self.thermostats)
+        }
+        self.requests: List[Tuple[str, str]] = []
+
+    def _device(self, name: str) -> dict:
+        device = self.devices[name]
+        return {
+            "name": name,
+            "traits": {
+                "sdm.devices.traits.Info": {"customName": device["label"]},
+                "sdm.devices.traits.ThermostatMode": {"mode": device["mode"]},
+                "sdm.devices.traits.ThermostatEco": {"mode": device["eco"]},
+                "sdm.devices.traits.ThermostatTemperatureSetpoint": {
+                    "heatCelsius": device["heatCelsius"]
+                },
+            },
+            "parentRelations": [{"parent": f"{STRUCTURE}/rooms/living"}],
+        }
+
+    def respond(self, method: str, url: str, data: Optional[str]) -> Tuple[int, dict]:
+        """
+        Returns the status code and body for a request.
+        """
+        self.requests.append((method, url))
+        path = url[url.index(ENTERPRISE) :] if ENTERPRISE in url else url
+
+        if path.endswith("/structures"):
+            structure = {
+                "name": STRUCTURE,
+                "traits": {"sdm.structures.traits.Info": {"customName": "Home"}},
+            }
+            return 200, {"structures": [structure]}
+        elif path.endswith("/devices"):
+            return 200, {"devices": [self._device(name) for name in self.devices]}
+        elif path.endswith(":executeCommand"):
+            device = self.devices[path[: -len(":executeCommand")]]
+            command = json.loads(data)
+
+            # e.g. "sdm.devices.commands.ThermostatEco.SetMode"
+            trait = command["command"].split(".")[-2]
+            if trait == "ThermostatEco":
+                device["eco"] = command["params"]["mode"]
+            elif trait == "ThermostatMode":
+                device["mode"] = command["params"]["mode"]
+            else:
+                device.update(command["params"])
+
+            return 200, {}
+        elif path in self.devices:
+            return 200, self._device(path)
+
+        return 404, {"error": {"message": f"unknown URL: {url}"}}
+
+    def patch_nest(self, module):
+        sdm = self
+
+        async def send(api, method, url, headers, data):
+            import httpx
+
+            status, body = sdm.respond(method, url, data)
+            return httpx.Response(status, json=body, request=httpx.Request(method, url))
+
+        module.AsyncNestAPI._send = send
+        module.get_credentials = lambda **kwargs: FakeCredentials()
+
+
+class _Request:
+    def __init__(self, result: dict):
+        self.result = result
+
+    def execute(self) -> dict:
+        return self.result
+
+
+class FakeCalendar:
+    """
+    A Google calendar holding ``items`` (Calendar API event resources).  Only
+    what noogle uses of ``events().list`` is supported; the time window is
+    ignored, so only add events that are inside it.
+    """
+
+    def __init__(self, items: Optional[List[dict]] = None):
+        self.items = list(items or [])
+        self.requests = 0
+
+    def events(self) -> "FakeCalendar":
+        return self
+
+    def list(
+        self,
+        q: Optional[str] = None,
+        maxResults: int = 250,
+        pageToken: Optional[str] = None,
+        **kwargs,
+    ) -> _Request:
+        self.requests += 1
+        items = [
+            e for e in self.items if (not q) or (q.lower() in e["summary"].lower())
+        ]
+
+        start = int(pageToken or 0)
+        result: dict = {"items": items[start : start + maxResults]}
+        if start + maxResults < len(items):
+            result["nextPageToken"] = str(start + maxResults)
+        else:
+            result["nextSyncToken"] = "bench"
+
+        return _Request(result)
+
+    def patch_gcal(self, module):
+        module.get_calendar_service = lambda: self
+
+
+class Mailbox:
+    """
+    Keeps the messages "sent" through Mailgun.
+    """
+
+    def __init__(self):
+        self.messages: List[Dict[str, str]] = []
+
+    def patch_mailgun(self, module):
+        def send_message(
+            subject: str = "Notification from noogle", text=None, **kwargs
+        ):
+            self.messages.append({"subject": subject, "text": text})
+
+        module.send_message = send_message
+
+
+class _PatchOnImport(importlib.abc.MetaPathFinder):
+    """
+    Calls the patch for a module right after the module is first imported.
+    """
+
+    def __init__(self, patches: Dict[str, Callable]):
+        self.patches = patches
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in self.patches:
+            return None
+
+        sys.meta_path.remove(self)
+        try:
+            spec = importlib.util.find_spec(fullname)
+        finally:
+            sys.meta_path.insert(0, self)
+
+        if spec is None or spec.loader is None:
+            return spec
+
+        patch = self.patches[fullname]
+        exec_module = spec.loader.exec_module
+
+        def exec_and_patch(module):
+            exec_module(module)
+            patch(module)
+
+        spec.loader.exec_module = exec_and_patch  # type: ignore
+        return spec
+
+
+def install(
+    sdm: Optional[FakeSDM] = None,
+    mailbox: Optional[Mailbox] = None,
+    calendar: Optional[FakeCalendar] = None,
+) -> Tuple[FakeSDM, Mailbox, FakeCalendar]:
+    """
+    Replaces the network calls in noogle with ``sdm``, ``mailbox`` and
+    ``calendar``, now for the modules that are already imported and on
+    import for the rest.
+    """
+    sdm = sdm or FakeSDM()
+    mailbox = mailbox or Mailbox()
+    calendar = calendar or FakeCalendar()
+    patches = {
+        "noogle.gcal": calendar.patch_gcal,
+        "noogle.nest": sdm.patch_nest,
+        "noogle.mailgun": mailbox.patch_mailgun,
+        # It has its own reference to `send_message`.
+        "noogle.outbox": mailbox.patch_mailgun,
+    }
+
+    pending = {}
+    for name, patch in patches.items():
+        if name in sys.modules:
+            patch(sys.modules[name])
+        else:
+            pending[name] = patch
+
+    if pending:
+        sys.meta_path.insert(0, _PatchOnImport(pending))
+
+    return sdm, mailbox, calendar
+
+
+def main():
+    install()
+    sys.argv = ["noogle"] + sys.argv[1:]
+    runpy.run_module("noogle", run_name="__main__", alter_sys=True)
+
+
+if __name__ == "__main__":
+    main()
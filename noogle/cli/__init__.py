@@ -7,20 +7,12 @@ line.
 # pylint:disable=W0212
 
 # Imports #####################################################################
+import logging
+
 import click
 
 from .. import __version__ as library_version
-from ..db import session
-from .init import init
-from .logs import logs
-from .main import go
-from .purge import purge
-from .service import service
-from .set_ import set_
-from .settings import settings
-from .setup import setup
-from .shell import shell
-from .show import show
+from .lazy import LazyGroup
 
 # Metadata ####################################################################
 __author__ = "Timothy McFadden"
@@ -34,21 +26,45 @@ noogle v{0}
     library_version
 )
 
+# The subcommands are only imported when they're run; see `LazyGroup`.
+SUBCOMMANDS = {
+    "go": (".main:go", "Main function to get and process events."),
+    "init": (".init:init", "Initialize app"),
+    "logs": (".logs:logs", "Control the log files"),
+    "purge": (".purge:purge", "Purge data from the database"),
+    "service": (".service:service", "Run a command in service mode"),
+    "set": (".set_:set_", "Set parameters"),
+    "settings": (".settings:settings", "Application settings"),
+    "setup": (".setup:setup", "Run the setup for Google calendar or Nest"),
+    "shell": (".shell:shell", "Run an IPython shell"),
+    "show": (".show:show", "Show information"),
+}
+
 
 class Ctx(object):
     """The context object"""
 
     def __init__(self):
-        self.session = None
+        self._session = None
         self.quiet = False
         self.napi = None
         self.debug = False
 
+    @property
+    def session(self):
+        """The database session, imported when a command first uses it"""
+        if self._session is None:
+            from ..db import session
+
+            self._session = session
+
+        return self._session
+
 
 CTX = click.make_pass_decorator(Ctx, ensure=True)
 
 
-@click.group(help=HELP)
+@click.group(cls=LazyGroup, lazy_subcommands=SUBCOMMANDS, help=HELP)
 @click.option("--quiet", "-q", is_flag=True, help="Only report errors")
 @click.option(
     "--debug/--no-debug", "-d", is_flag=True, default=False, help="Debug use only"
@@ -58,16 +74,21 @@ def cli(ctx, quiet, debug):
     """Run the noogle command-line application"""
     ctx.quiet = quiet
     ctx.debug = debug
-    ctx.session = session
-
-
-cli.add_command(go)
-cli.add_command(init)
-cli.add_command(logs)
-cli.add_command(purge)
-cli.add_command(service)
-cli.add_command(set_)
-cli.add_command(settings)
-cli.add_command(setup)
-cli.add_command(shell)
-cli.add_command(show)
+
+    # Only read the settings once a command is actually run (not for
+    # `--help`).
+    init_logging()
+
+
+def init_logging():
+    from ..logger import init_logger
+    from ..settings import settings
+
+    init_logger(
+        timezone=settings.calendar.timezone,
+        logfile=settings.logging.logfile,
+        logfile_mode="a",
+        logfile_level=logging.DEBUG,
+        debug=settings.general.debug,
+        third_party_loggers=["googleapiclient", "oauth2client"],
+    )
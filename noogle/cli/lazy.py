@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module holds a click group that only imports a subcommand when it's
+used.
+"""
+# Imports #####################################################################
+import importlib
+from typing import Dict, List, Optional, Tuple
+
+import click
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+
+class LazyGroup(click.Group):
+    """
+    A group whose subcommands are imported on first use.
+
+    ``lazy_subcommands`` maps each command name to the ``module:attribute``
+    it lives in and its short help, so ``--help`` can list the commands
+    without importing any of them.
+    """
+
+    def __init__(
+        self,
+        *args,
+        lazy_subcommands: Optional[Dict[str, Tuple[str, str]]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if (cmd_name not in self.commands) and (cmd_name in self.lazy_subcommands):
+            self.add_command(self._load(cmd_name), cmd_name)
+
+        return super().get_command(ctx, cmd_name)
+
+    def _load(self, cmd_name: str) -> click.Command:
+        import_path, _ = self.lazy_subcommands[cmd_name]
+        module_name, attribute = import_path.split(":")
+        module = importlib.import_module(module_name, package=__package__)
+
+        command = getattr(module, attribute)
+        if not isinstance(command, click.Command):
+            raise ValueError(f"{import_path} is not a click command")
+
+        return command
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                command = self.commands[name]
+                if command.hidden:
+                    continue
+                short_help = command.get_short_help_str(formatter.width)
+            else:
+                short_help = self.lazy_subcommands[name][1]
+
+            rows.append((name, short_help))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
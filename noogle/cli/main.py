@@ -25,19 +25,18 @@ def go():
     """
     ctx = click.get_current_context().obj
 
-    # Grab the next 10 events
-    print_log("Reading events from Google calendar...", nl=False)
+    # Cache the events as they're read
+    print_log("Reading events from Google calendar...")
     q_filter = "nestd" if ctx.debug else "nest"
-    my_events = get_next_gcal_events(max_results=10, q_filter=q_filter)
-    print_log("...done")
-
-    my_events = [Event.create_from_gcal(x, commit=False) for x in my_events]
 
-    for event in my_events:
+    for gcal_event in get_next_gcal_events(q_filter=q_filter):
+        event = Event.create_from_gcal(gcal_event, commit=False)
         if not Event.exists(event.event_id, event.scheduled_date):
             print_log("caching new event: {0}".format(event))
             event.commit()
 
+    print_log("...done")
+
     # Get all events that haven't been actioned
     waiting_events = Event.waiting()
     print_log(waiting_events)
@@ -4,221 +4,540 @@
 This module holds the cli `service` commands
 """
 
+import functools
+import itertools
 import logging
+import threading
 import time
 import traceback
+from pathlib import Path
 from pprint import pformat
+from typing import Callable, Dict, Iterable, List, Optional
 
 import arrow
 import click
-import inflect
-from sqlalchemy import and_
 
+# The gcal and nest modules (and the Google and HTTP clients behind them) are
+# imported where they're used, so each command only loads what it needs.
 from ..db import session
-from ..gcal import get_next_gcal_events
 from ..helpers import format_future_time, print_log
-from ..mailgun import send_message
 from ..models import Event, State
-from ..nest import NestAPI
-from ..settings import DEBUG
-from ..utils import get_scheduled_date
+from ..outbox import Sender, enqueue
+from ..scheduler import PeriodicTask, Scheduler
+from ..settings import settings
+from ..utils import to_timestamp
 
 # Globals #####################################################################
-inflect_engine = inflect.engine()
+_inflect_engine = None
+
+
+def plural(noun: str, count: int) -> str:
+    # inflect takes seconds to import, so only load it to write a report.
+    global _inflect_engine
+
+    if _inflect_engine is None:
+        import inflect
+
+        _inflect_engine = inflect.engine()
+
+    return _inflect_engine.plural(noun, count)
 
 
 @click.group()
 def service():
     """Run a command in service mode"""
-    pass
 
 
-def check_gcal() -> None:
-    text_lines = []
-    print_log("GCAL: Reading events from Google calendar...")
+def start_sender() -> None:
+    """
+    Starts emailing reports in the background so the loops never wait on
+    Mailgun; whatever is due is sent when the current command exits.  Only
+    the commands that run call this, so ``--help`` never touches the outbox.
+    """
+    sender = Sender()
+    sender.start()
+    click.get_current_context().call_on_close(sender.stop)
+
+
+def check_gcal(incremental: Optional[bool] = None) -> None:
+    """
+    Reads the calendar and updates the cached events.  With ``incremental``
+    (defaults to ``settings.calendar.incremental_sync``) only the events that
+    changed since the last poll are read and applied.
+    """
+    from ..gcal import get_gcal_changes, get_next_gcal_events, matches_filter
+
+    if incremental is None:
+        incremental = settings.calendar.incremental_sync
+
     q_filter = "nest"
-    gcal_events = get_next_gcal_events(max_results=10, q_filter=q_filter)
-    print_log("GCAL: ...done")
+    print_log("GCAL: Reading events from Google calendar...")
+
+    if incremental:
+        changes = get_gcal_changes()
+        print_log("GCAL: ...done")
+
+        if changes.full:
+            gcal_events = (e for e in changes.events if matches_filter(e, q_filter))
+            text_lines = reconcile_gcal_events(gcal_events)
+        else:
+            text_lines = apply_gcal_changes(changes.events, q_filter)
+
+        changes.commit()
+    else:
+        gcal_events = get_next_gcal_events(q_filter=q_filter)
+        text_lines = reconcile_gcal_events(gcal_events)
+        print_log("GCAL: ...done")
+
+    send_report(text_lines, noun="event")
+
+
+def reconcile_gcal_events(gcal_events: Iterable[dict]) -> List[str]:
+    """
+    Caches new events as they're read from ``gcal_events`` and marks cached
+    events that weren't in it as removed.  Only the events in the
+    `sync_window` are compared, since that's all ``gcal_events`` holds;
+    events whose names don't say what to do, or that started before the
+    window (Google returns events that are still going on), are skipped.
+
+    The keys of the cached events in the window are read with a single
+    query, the missing events are found with `Event.events_missing`, and the
+    result is written in one transaction.
+    """
+    from ..gcal import sync_window
+
+    text_lines = []
+    window_start, window_end = sync_window()
+    since, until = to_timestamp(window_start), to_timestamp(window_end)
+
+    # Everything in the window, so we don't re-cache events that have
+    # already been completed or removed.
+    cached = set(
+        session.query(Event.event_id, Event.scheduled_at).filter(
+            Event.scheduled_at.between(since, until)
+        )
+    )
+
+    # The keys of the events read, for finding the missing ones.
+    seen = set()
+    new_events = []
 
     for event in gcal_events:
-        if not Event.exists(
-            event["id"], get_scheduled_date(event), state=State.waiting
-        ):
-            existing = (
-                session.query(Event)
-                .filter(
-                    and_(
-                        Event.event_id == event["id"],
-                        Event.scheduled_date == get_scheduled_date(event),
-                    )
-                )
-                .first()
+        new_event = Event.create_from_gcal(event, commit=False)
+        if new_event.action is None:
+            print_log(
+                "GCAL: skipping event with no action: {}".format(new_event.name),
+                log_level=logging.WARNING,
             )
+            continue
+        elif not (since <= new_event.scheduled_at <= until):
+            continue
 
-            if existing and (existing.state != State.waiting):
-                # The event has already been completed
-                continue
+        key = (new_event.event_id, new_event.scheduled_at)
 
-            message = "GCAL: caching new event:\n" + pformat(event)
-            print_log(message)
-            text_lines.append(message)
-            Event.create_from_gcal(event)
+        if (key in seen) or (key in cached):
+            seen.add(key)
+            continue
+
+        seen.add(key)
+        message = "GCAL: caching new event:\n" + pformat(event)
+        print_log(message)
+        text_lines.append(message)
+        new_events.append(new_event)
 
     # Any event that's not completed and not found in our list should be
     # set to 'removed'.
-    removed_events = Event.events_missing(gcal_events)
+    removed_events = Event.events_missing(seen, window_start, window_end)
     if removed_events:
         print_log(
             "found {} cached {} that aren't in gcal".format(
                 len(removed_events),
-                inflect_engine.plural("event", len(removed_events)),
+                plural("event", len(removed_events)),
             ),
             log_level=logging.WARNING,
         )
 
     for event in removed_events:
-        message = "GCAL: marking missing event:\n" + pformat(repr(event))
-        text_lines.append(message)
-        print_log(message)
-        event.mark_event_missing()
+        # The Nest service may have actioned it in the meantime.
+        if event.transition(State.removed, commit=False):
+            message = "GCAL: marking missing event:\n" + pformat(repr(event))
+            text_lines.append(message)
+            print_log(message)
 
-    # Send the email
-    if DEBUG and text_lines:
+    session.add_all(new_events)
+    session.commit()
+
+    return text_lines
+
+
+def apply_gcal_changes(
+    gcal_events: Iterable[dict], q_filter: str = "nest"
+) -> List[str]:
+    """
+    Applies the changed events from an incremental sync to the cache.
+    Cancelled events, and events that no longer match ``q_filter``, don't
+    say what to do or have moved out of the `sync_window`, remove any waiting
+    cached copies; moved events replace them.
+
+    The changes are handled a page at a time as they're read, with one
+    query for the cached copies of each page's events.
+    """
+    from ..gcal import matches_filter, sync_window
+
+    text_lines = []
+    since, until = (to_timestamp(t) for t in sync_window())
+
+    cached: Dict[str, List[Event]] = {}
+    new_events = []
+    gcal_events = iter(gcal_events)
+
+    while True:
+        page = list(itertools.islice(gcal_events, settings.calendar.page_size))
+        if not page:
+            break
+
+        event_ids = {e["id"] for e in page} - cached.keys()
+        for e in session.query(Event).filter(Event.event_id.in_(event_ids)):
+            cached.setdefault(e.event_id, []).append(e)
+
+        for event in page:
+            new_event = None
+            if matches_filter(event, q_filter):
+                new_event = Event.create_from_gcal(event, commit=False)
+                if new_event.action is None:
+                    print_log(
+                        "GCAL: skipping event with no action: {}".format(
+                            new_event.name
+                        ),
+                        log_level=logging.WARNING,
+                    )
+                    new_event = None
+                elif not (since <= new_event.scheduled_at <= until):
+                    new_event = None
+
+            scheduled_at = new_event.scheduled_at if new_event else None
+            existing = cached.setdefault(event["id"], [])
+
+            for e in existing:
+                if (
+                    (e.state == State.waiting)
+                    and (e.scheduled_at != scheduled_at)
+                    and e.transition(State.removed, commit=False)
+                ):
+                    message = "GCAL: marking missing event:\n" + pformat(repr(e))
+                    text_lines.append(message)
+                    print_log(message)
+
+            if new_event is None:
+                continue
+
+            if not any(e.scheduled_at == scheduled_at for e in existing):
+                message = "GCAL: caching new event:\n" + pformat(event)
+                print_log(message)
+                text_lines.append(message)
+                new_events.append(new_event)
+                existing.append(new_event)
+
+    session.add_all(new_events)
+    session.commit()
+
+    return text_lines
+
+
+def send_report(text_lines: List[str], noun: str = "event") -> None:
+    """
+    Queues ``text_lines`` to be emailed, or just logs them in debug mode.
+    """
+    if settings.general.debug and text_lines:
         print_log("DEBUG on; would have sent:")
         print_log("\n".join(text_lines))
     elif text_lines:
-        print_log("sending message")
-        send_message(
-            subject="{} processed".format(
-                inflect_engine.plural("event", len(text_lines))
-            ),
+        print_log("queueing message")
+        enqueue(
+            subject="{} processed".format(plural(noun, len(text_lines))),
             text="\n".join(text_lines),
         )
 
 
 @service.command()
 @click.option(
-    "-p", "--poll", help="Number of minutes to wait between checks", default=5
+    "-p",
+    "--poll",
+    type=int,
+    help="Number of minutes to wait between checks [default: 5, or 60 with --webhook]",
 )
 @click.option("--quiet", "-q", is_flag=True, help="Only report errors")
 @click.option("--once", "-o", is_flag=True, help="Only run once; do not loop")
-def gcal(poll, quiet, once: bool = False):
+@click.option(
+    "--webhook",
+    "-w",
+    is_flag=True,
+    help="Sync when Google sends a change notification; only poll as a fallback",
+)
+def gcal(poll, quiet, once: bool = False, webhook: bool = False):
     """Look for events in Google and add them to the cache"""
     ctx = click.get_current_context()
     ctx.obj.quiet = quiet
+    start_sender()
 
     if quiet:
         # Let the user know we started up.
         print_log("GCAL: Starting service", force_print=True)
 
-    poll *= 60
+    poll = (poll or (60 if webhook else 5)) * 60
 
-    while True:
-        # Grab the next 10 events
-        check_gcal()
+    receiver = None
+    if webhook and not once:
+        from ..webhook import CalendarWebhook
 
-        if once:
-            return
+        receiver = CalendarWebhook()
+        receiver.start()
 
-        print_log("GCAL: waiting until %s" % format_future_time(seconds=poll))
-        time.sleep(poll)
+    try:
+        while True:
+            # Notifications don't say what changed, so they need a sync token.
+            check_gcal(incremental=True if webhook else None)
 
+            if once:
+                return
+
+            print_log("GCAL: waiting until %s" % format_future_time(seconds=poll))
+            if receiver:
+                if receiver.wait(poll):
+                    print_log("GCAL: change notification received")
+            else:
+                time.sleep(poll)
+    finally:
+        if receiver:
+            receiver.stop()
 
-def check_nest() -> None:
-    text_lines = []
 
-    events = Event.waiting()
+def check_nest(
+    events: Optional[List[Event]] = None, timeout: Optional[float] = None
+) -> None:
+    """
+    Runs ``events``; by default, every waiting event that's past, but
+    within 2 days.  ``timeout`` is how long to wait for the thermostats to
+    reach the state for each event.
+    """
+    from ..nest import NestAPI
 
-    # Look for any events that are past, but within 2 days.
-    two_days_ago = arrow.get().shift(days=-2)
-    events = [
-        event
-        for event in events
-        if (arrow.get(event.scheduled_date) >= two_days_ago)
-        and (arrow.get(event.scheduled_date) <= arrow.now())
-    ]
+    text_lines = []
+
+    # Marking an event done commits, so read the (few) due events up front.
+    if events is None:
+        now = arrow.utcnow()
+        events = list(Event.due(now.shift(days=-2), now))
 
     if not events:
         return
 
     print_log("NEST: %d events waiting..." % len(events), nl=False)
-    api = NestAPI()
-
-    for event in events:
-        text_lines.append(f"NEST:...doing {event}")
-        print_log(f"NEST:...doing {event}")
-
-        try:
-            api.do_action(event.action)
-            event.mark_event_done()
-            text_lines.append("NEST: ......done")
-        except Exception as e:
-            logging.exception(e)
-            text_lines.append(str(e))
-            text_lines.append(traceback.format_exc())
-
-        print_log("NEST: ......done")
+    with NestAPI() as api:
+        for event in events:
+            text_lines.append(f"NEST:...doing {event}")
+            print_log(f"NEST:...doing {event}")
+
+            try:
+                api.do_action(event.action, timeout=timeout)
+                if event.mark_event_done():
+                    text_lines.append("NEST: ......done")
+                else:
+                    message = f"NEST: ......{event} was changed while it was being done"
+                    print_log(message, log_level=logging.WARNING)
+                    text_lines.append(message)
+            except Exception as e:
+                logging.exception(e)
+                text_lines.append(str(e))
+                text_lines.append(traceback.format_exc())
+
+            print_log("NEST: ......done")
 
     # Send the email
-    if DEBUG and text_lines:
-        print_log("DEBUG on; would have sent:")
-        print_log("\n".join(text_lines))
-    elif text_lines:
-        print_log("sending message")
-        send_message(
-            subject="{} processed".format(
-                inflect_engine.plural("Event", len(text_lines))
-            ),
-            text="\n".join(text_lines),
-        )
+    send_report(text_lines, noun="Event")
 
 
 @service.command()
-@click.option("-p", "--poll", default=5)
+@click.option(
+    "-p",
+    "--poll",
+    default=5,
+    help="Number of minutes between re-reading the cached events",
+)
 @click.option("--quiet", "-q", is_flag=True, help="Only report errors")
 @click.option("--once", "-o", is_flag=True, help="Only run once; do not loop")
 def nest(poll, quiet, once: bool = False):
     """Wait for and process Nest events"""
     ctx = click.get_current_context()
     ctx.obj.quiet = quiet
+    start_sender()
 
     if quiet:
         # Let the user know we started up.
         print_log("NEST: Starting service", force_print=True)
 
-    poll *= 60
-
-    while True:
+    if once:
         check_nest()
+        return
+
+    # Events are run when they're due; polling only picks up new events
+    # cached by another process.
+    Scheduler(check_nest, resync=poll * 60).run()
 
-        if once:
-            return
 
-        print_log("NEST: waiting until %s" % format_future_time(seconds=poll))
-        time.sleep(poll)
+def in_context(func: Callable) -> Callable:
+    """
+    Wraps ``func`` so it runs in the current click context from any thread
+    (`print_log` needs it).
+    """
+    ctx = click.get_current_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with ctx.scope(cleanup=False):
+            return func(*args, **kwargs)
+
+    return wrapper
 
 
 @service.command()
-@click.option("-p", "--poll", default=5)
+@click.option(
+    "-p",
+    "--poll",
+    type=int,
+    help="Number of minutes between calendar checks [default: 5, or 60 with --webhook]",
+)
+@click.option(
+    "--nest-poll",
+    default=5,
+    help="Number of minutes between re-reading the cached events",
+    show_default=True,
+)
+@click.option(
+    "--gcal-timeout",
+    default=300,
+    help="Seconds to wait for a calendar check before giving up on it",
+    show_default=True,
+)
+@click.option(
+    "--nest-timeout",
+    type=float,
+    help="Seconds to wait for the thermostats to converge on each event "
+    "[default: nest.convergence_timeout]",
+)
 @click.option("--quiet", "-q", is_flag=True, help="Only report errors")
 @click.option("--once", "-o", is_flag=True, help="Only run once; do not loop")
-def both(poll, quiet, once: bool = False):
+@click.option(
+    "--webhook",
+    "-w",
+    is_flag=True,
+    help="Check the calendar when Google sends a change notification",
+)
+def both(
+    poll,
+    nest_poll,
+    gcal_timeout,
+    nest_timeout,
+    quiet,
+    once: bool = False,
+    webhook: bool = False,
+):
     """Keep checking Google Calendar and Nest"""
     ctx = click.get_current_context()
     ctx.obj.quiet = quiet
+    start_sender()
 
     if quiet:
         # Let the user know we started up.
         print_log("noogle: Starting service", force_print=True)
 
-    poll *= 60
-
-    while True:
+    if once:
         check_gcal()
-        check_nest()
+        check_nest(timeout=nest_timeout)
+        return
+
+    # The two pipelines run in their own threads and only share the
+    # database: the calendar task caches events and wakes the scheduler,
+    # which runs them when they're due.
+    scheduler = Scheduler(
+        in_context(functools.partial(check_nest, timeout=nest_timeout)),
+        resync=nest_poll * 60,
+    )
+    nest_thread = threading.Thread(target=scheduler.run, name="nest", daemon=True)
+
+    receiver = None
+    if webhook:
+        from ..webhook import CalendarWebhook
+
+        receiver = CalendarWebhook()
+        receiver.start()
+
+    def gcal_cycle():
+        check_gcal(incremental=True if webhook else None)
+        scheduler.wake()
+
+    gcal_task = PeriodicTask(
+        "gcal",
+        in_context(gcal_cycle),
+        interval=(poll or (60 if webhook else 5)) * 60,
+        timeout=gcal_timeout,
+        wait=receiver.wait if receiver else None,
+    )
+
+    nest_thread.start()
+    gcal_task.start()
+
+    try:
+        while nest_thread.is_alive() and gcal_task.is_alive():
+            nest_thread.join(1)
+    finally:
+        gcal_task.stop()
+        if receiver:
+            receiver.stop()
+
+    raise click.ClickException("A service thread stopped unexpectedly")
+
+
+@service.command()
+@click.option(
+    "--subscription",
+    "-s",
+    help="The Pub/Sub subscription to read (defaults to nest.subscription)",
+)
+@click.option(
+    "--file",
+    "-f",
+    "path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Read the events from a file of JSON lines instead of Pub/Sub",
+)
+@click.option("--follow", is_flag=True, help="Keep reading the file as it grows")
+@click.option("--quiet", "-q", is_flag=True, help="Only report errors")
+def events(subscription, path, follow, quiet):
+    """Apply the Nest device events pushed through Pub/Sub"""
+    from ..nest import NestAPI
+    from ..pubsub import FileSubscriber, PubSubSubscriber, consume
+
+    ctx = click.get_current_context()
+    ctx.obj.quiet = quiet
+
+    if path:
+        subscriber = FileSubscriber(path, follow=follow)
+    else:
+        subscription = subscription or settings.nest.subscription
+        if not subscription:
+            raise click.UsageError("No subscription given or set in nest.subscription")
+        subscriber = PubSubSubscriber(subscription)
+
+    start_sender()
+
+    if quiet:
+        # Let the user know we started up.
+        print_log("EVENTS: Starting service", force_print=True)
 
-        if once:
-            return
+    # Start from the current state; the events only carry what changed.
+    with NestAPI(load=False) as api:
+        api.load(force=True)
 
-        print_log("noogle: waiting until %s" % format_future_time(seconds=poll))
-        time.sleep(poll)
+    applied = consume(subscriber)
+    print_log(f"EVENTS: applied {applied} updates")
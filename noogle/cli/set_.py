@@ -9,8 +9,8 @@ import click
 
 from ..helpers import print_log
 from ..models import Action, Event, State
-from ..nest import NestAPI
 from ..settings import settings
+from ..utils import to_timestamp
 
 # Metadata ####################################################################
 __author__ = "Timothy McFadden"
@@ -32,15 +32,19 @@ def set_():
 @set_.command()
 def home():
     """Sets the structure to `home` and thermostat to `heat`"""
-    napi = NestAPI()
-    napi.do_action(Action.home)
+    from ..nest import NestAPI
+
+    with NestAPI() as napi:
+        napi.do_action(Action.home)
 
 
 @set_.command()
 def away():
     """Sets the structure to `away` and thermostat to `eco`"""
-    napi = NestAPI()
-    napi.do_action(Action.away)
+    from ..nest import NestAPI
+
+    with NestAPI() as napi:
+        napi.do_action(Action.away)
 
 
 def print_event(index, event):
@@ -85,7 +89,10 @@ def events():
 
     while True:
         events = [
-            e for e in ctx.session.query(Event).filter(Event.scheduled_date >= since)
+            e
+            for e in ctx.session.query(Event).filter(
+                Event.scheduled_at >= to_timestamp(since)
+            )
         ]
 
         for index, event in enumerate(events):
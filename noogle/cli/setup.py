@@ -42,5 +42,6 @@ def nest():
     """Set up Nest"""
     ctx = click.get_current_context().obj
     ctx.logger.debug("calling `NestApi.show()`")
-    NestAPI().show()
+    with NestAPI() as napi:
+        napi.show()
     ctx.logger.debug("...done")
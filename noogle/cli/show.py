@@ -14,10 +14,15 @@ import arrow
 # Imports #####################################################################
 import click
 
+from sqlalchemy import func
+
+from ..db import explain
 from ..helpers import print_log
 from ..models import Event, State
-from ..nest import NestAPI
+from ..models import Structure as StructureModel
+from ..models import Thermostat as ThermostatModel
 from ..settings import settings
+from ..utils import to_timestamp
 
 # Metadata ####################################################################
 __author__ = "Timothy McFadden"
@@ -56,7 +61,7 @@ def events(max_events, removed):
 
     print_log("Showing events since %s" % since.to("local").strftime("%A, %d %B"))
 
-    events = ctx.session.query(Event).filter(Event.scheduled_date >= since)
+    events = ctx.session.query(Event).filter(Event.scheduled_at >= to_timestamp(since))
 
     if not removed:
         events = events.filter(Event.state != State.removed)
@@ -66,7 +71,7 @@ def events(max_events, removed):
         return
 
     timezone = settings.calendar.timezone
-    for event in events.order_by(Event.scheduled_date):
+    for event in events.order_by(Event.scheduled_at):
         print_log(
             "{:<20s}({:^9}) {}".format(
                 event.scheduled_date.to(timezone).format("YYYY-MM-DD hh:mm A"),
@@ -98,17 +103,78 @@ def cache():
 @show.command()
 def structures():
     """Show the structure information"""
-    NestAPI().show()
+    from ..nest import NestAPI
+
+    with NestAPI() as napi:
+        napi.show()
 
 
 @show.command()
 def away():
     """Show the away state for the controlled thermostat"""
+    from ..nest import NestAPI
+
     ctx = click.get_current_context().obj
-    napi = NestAPI()
+    with NestAPI() as napi:
+        structures = napi.structures
 
     structure_name = settings.nest.structure
-    structure = next((x for x in napi.structures if x.name == structure_name))
+    structure = next((x for x in structures if x.name == structure_name))
 
     print_log("Structure: %s" % structure.name)
     print_log("     Away: %s" % structure.away)
+
+
+@show.command()
+def plans():
+    """Check that the service's hot queries use their indexes"""
+    ctx = click.get_current_context().obj
+    now = arrow.utcnow()
+
+    checks = [
+        (
+            "waiting events",
+            ctx.session.query(Event).filter(Event.state == State.waiting),
+            "ix_events_state_scheduled_at",
+        ),
+        (
+            "due events",
+            Event.due(now.shift(days=-2), now),
+            "ix_events_state_scheduled_at",
+        ),
+        (
+            "show events",
+            ctx.session.query(Event)
+            .filter(
+                Event.scheduled_at >= to_timestamp(now),
+                Event.state != State.removed,
+            )
+            .order_by(Event.scheduled_at),
+            "ix_events_scheduled_at",
+        ),
+        (
+            "thermostat lookup",
+            ctx.session.query(ThermostatModel).filter_by(name="", structure_name=""),
+            "ix_thermostats_name_structure_name",
+        ),
+        (
+            "structure lookup",
+            ctx.session.query(StructureModel).filter(
+                func.lower(StructureModel.custom_name) == ""
+            ),
+            "ix_structures_custom_name_lower",
+        ),
+    ]
+
+    failed = 0
+    for name, query, index in checks:
+        plan = explain(query)
+        ok = any(index in line for line in plan)
+        failed += not ok
+
+        print_log(f"{name}: {'OK' if ok else 'NOT USING ' + index}")
+        for line in plan:
+            print_log(f"    {line}")
+
+    if failed:
+        click.get_current_context().exit(1)
@@ -1,18 +1,149 @@
 #!/usr/bin/env python3.7
+import threading
+from typing import Any, List, Optional, Sequence
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Query, scoped_session, sessionmaker
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 from .settings import settings
 
-engine = create_engine(settings.database.uri.get_secret_value())
 Base: DeclarativeMeta = declarative_base()
-Session = sessionmaker(bind=engine)
-session = Session()
+Session = sessionmaker()
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """
+    Returns the database engine, creating it from the settings on first use.
+    """
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(settings.database.uri.get_secret_value())
+            Session.configure(bind=_engine)
+
+    return _engine
+
+
+def configure(uri: Optional[str] = None, engine: Optional[Engine] = None) -> Engine:
+    """
+    Points noogle at a different database (e.g. for tests or when embedding
+    it) by ``uri`` or an existing ``engine``.  The current thread's session
+    is closed; the next use of `session` opens one on the new engine.
+    """
+    global _engine
+
+    if engine is None:
+        engine = create_engine(uri or settings.database.uri.get_secret_value())
+
+    session.remove()
+    with _engine_lock:
+        _engine = engine
+        Session.configure(bind=_engine)
+
+    return _engine
+
+
+def _create_session():
+    get_engine()
+    return Session()
+
+
+# Each thread (e.g. the `service both` pipelines) gets its own session, which
+# (along with the engine) is only created when it's first used.
+session = scoped_session(_create_session)
+
+
+def __getattr__(name: str) -> Any:
+    # Kept for compatibility; prefer `get_engine`.
+    if name == "engine":
+        return get_engine()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def init():
-    from .models import Event, Structure, Thermostat  # noqa
+    from .models import CalendarSync, Event, Outbox, Structure, Thermostat  # noqa
 
+    engine = get_engine()
     Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
+
+
+class Explain(Executable, ClauseElement):
+    """`EXPLAIN` for a statement, compiled per dialect."""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "sqlite")
+def _compile_explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+def upsert(model, rows: List[dict], index_elements: Sequence[str]):
+    """
+    Inserts ``rows`` into the table for ``model`` with a single statement,
+    updating the existing rows that conflict on ``index_elements`` (which
+    must be covered by a unique index).  Uses ``INSERT ... ON CONFLICT`` on
+    SQLite and PostgreSQL and falls back to a query per row elsewhere.
+
+    The caller is responsible for committing.
+    """
+    if not rows:
+        return
+
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        for row in rows:
+            keys = {k: row[k] for k in index_elements}
+            instance = session.query(model).filter_by(**keys).first()
+            if instance:
+                for key, value in row.items():
+                    setattr(instance, key, value)
+            else:
+                session.add(model(**row))
+        return
+
+    statement = insert(model.__table__).values(rows)
+    update = {
+        column: statement.excluded[column]
+        for column in rows[0]
+        if column not in index_elements
+    }
+
+    if update:
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements, set_=update
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=index_elements)
+
+    session.execute(statement)
+
+
+def explain(query: Query) -> List[str]:
+    """
+    Returns the database's query plan for ``query``, one line per step.
+    """
+    result = session.execute(Explain(query.statement))
+    return [str(row[-1]) for row in result]
@@ -4,31 +4,44 @@
 This module holds the interface to Google calendar.
 """
 # Imports #####################################################################
+import logging
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, Tuple
+
 import arrow
-from apiclient import discovery
 from googleapiclient.errors import HttpError
 
 from .db import session
 from .google_auth import get_credentials
 from .helpers import print_log
-from .models import Event
+from .models import CalendarSync, Event
 from .settings import settings
 
 # Metadata ####################################################################
 __author__ = "Timothy McFadden"
 __creationDate__ = "08-JUN-2017"
 
+# Globals #####################################################################
+_service = None
+_service_credentials = None
+_service_lock = threading.Lock()
+
+# With incremental sync, only events that change are returned, so events
+# that slide into the window are picked up by reading the whole window again
+# once it has moved on this far.
+RESYNC_AFTER = 24 * 60 * 60
+
 
 def setup():
     """
     Set up your credentials for access to google calendar.
     """
-    events = get_next_gcal_events()
-    if not events:
-        print_log("No upcoming events found.")
-        return
+    found = False
 
-    for event in events:
+    for event in get_next_gcal_events():
+        found = True
         e = Event.create_from_gcal(event, commit=False)
         print_log(
             "{:<19s}({:^9}) {}".format(
@@ -36,56 +49,325 @@ def setup():
             )
         )
 
+    if not found:
+        print_log("No upcoming events found.")
+
 
-def get_next_gcal_events(max_results=10, q_filter="nest", since=None):
+def get_next_gcal_events(
+    q_filter="nest", since=None, until=None, page_size=None
+) -> Iterator[dict]:
     """
-    Returns a list of events filtered by ``q_filter``.
+    Yields the events filtered by ``q_filter``, following every page of
+    results.  Events are read between ``since`` and ``until``, which default
+    to the `sync_window`.
 
-    :param int max_results: The maximum number of results to return
-    :param str q: This is the "advanced search syntax" item
+    :param str q_filter: This is the "advanced search syntax" item
     :param datetime since: Get the events since this date
+    :param datetime until: Get the events before this date
+    :param int page_size: The number of events to request per page
     """
     calendar_id = settings.calendar.name
+    service = get_calendar_service()
 
-    credentials = get_credentials(
-        name="calendar", oauth_token=settings.calendar.token_file
-    )
-    service = discovery.build("calendar", "v3", credentials=credentials)
+    window_start, window_end = sync_window()
+    since = (since or window_start).to("UTC").isoformat()
+    until = (until or window_end).to("UTC").isoformat()
+    page_size = page_size or settings.calendar.page_size
+    page_token = None
+
+    while True:
+        try:
+            events_result = (
+                service.events()
+                .list(
+                    calendarId=calendar_id,
+                    timeMin=since,
+                    timeMax=until,
+                    maxResults=page_size,
+                    singleEvents=True,
+                    orderBy="startTime",
+                    q=q_filter,
+                    pageToken=page_token,
+                )
+                .execute()
+            )
+        except HttpError as e:
+            _check_calendar_error(e, calendar_id)
+            raise
+
+        yield from events_result.get("items", [])
+
+        page_token = events_result.get("nextPageToken")
+        if not page_token:
+            return
+
+
+@dataclass
+class CalendarChanges:
+    """
+    The result of an incremental sync.  ``full`` is `True` if the whole
+    `sync_window` was read (no sync token, it had expired or the window has
+    moved on); otherwise ``events`` only yields the events that changed,
+    including cancelled ones.
+
+    ``events`` reads the pages as they're needed; ``sync_token`` is set once
+    the last one has been read.
+    """
+
+    calendar_id: str
+    full: bool
+    window_end: Optional[int] = None
+    events: Iterator[dict] = field(default_factory=lambda: iter(()))
+    sync_token: Optional[str] = None
+
+    def commit(self):
+        """
+        Persists the sync token.  Call this once the changes have been
+        applied so a failure doesn't skip them on the next poll.  If the
+        events weren't all read, there's no token and the next poll reads
+        the whole window.
+        """
+        sync = get_calendar_sync(self.calendar_id)
+        sync.sync_token = self.sync_token
+        sync.updated = arrow.utcnow()
+        if self.full:
+            sync.window_end = self.window_end
+        session.add(sync)
+        session.commit()
+
+
+def get_gcal_changes() -> CalendarChanges:
+    """
+    Returns the events that changed since the last sync of the calendar.
+    The first page is read here; the rest as ``events`` is iterated.
+
+    The Calendar API doesn't allow ``q``, ``orderBy`` or ``timeMin`` together
+    with a sync token, so the events aren't filtered here; use
+    `matches_filter` on the results.  If there's no stored token, Google
+    says it has expired (410), or the window has moved on by `RESYNC_AFTER`,
+    every event in the `sync_window` is returned instead.
+    """
+    calendar_id = settings.calendar.name
+    service = get_calendar_service()
+    window_start, window_end = sync_window()
 
-    if since:
-        since = since.to("UTC").isoformat()
+    sync = session.query(CalendarSync).get(calendar_id)
+    sync_token = sync.sync_token if sync else None
+
+    if sync_token and (
+        (sync.window_end is None)
+        or (sync.window_end + RESYNC_AFTER <= window_end.int_timestamp)
+    ):
+        logging.info("GCAL: the sync window has moved on; doing a full sync")
+        sync_token = None
+
+    kwargs = {
+        "calendarId": calendar_id,
+        "singleEvents": True,
+        "maxResults": settings.calendar.page_size,
+    }
+    if sync_token:
+        kwargs["syncToken"] = sync_token
     else:
-        lookback = settings.calendar.lookback
-        since = (
-            arrow.now()
-            .replace(hour=0, minute=0, second=0, microsecond=0)
-            .shift(days=-1 * lookback)
-            .isoformat()
-        )
+        kwargs["timeMin"] = window_start.isoformat()
+        kwargs["timeMax"] = window_end.isoformat()
+
+    def get_page(page_token: Optional[str] = None) -> dict:
+        try:
+            return service.events().list(pageToken=page_token, **kwargs).execute()
+        except HttpError as e:
+            _check_calendar_error(e, calendar_id)
+            raise
 
     try:
-        events_result = (
-            service.events()
-            .list(
-                calendarId=calendar_id,
-                timeMin=since,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy="startTime",
-                q=q_filter,
-            )
-            .execute()
-        )
+        result = service.events().list(**kwargs).execute()
     except HttpError as e:
-        if e.resp["status"] == "404":
-            raise ValueError(
-                'Could not find your calendar: "%s".  Please check your settings!'
-                % calendar_id
-            )
+        if sync_token and e.resp["status"] == "410":
+            logging.warning("GCAL: sync token expired; doing a full sync")
+            sync.sync_token = None
+            session.commit()
+            return get_gcal_changes()
 
+        _check_calendar_error(e, calendar_id)
         raise
 
-    return events_result.get("items", [])
+    changes = CalendarChanges(
+        calendar_id=calendar_id,
+        full=not sync_token,
+        window_end=window_end.int_timestamp,
+    )
+
+    def events(result: dict) -> Iterator[dict]:
+        while True:
+            yield from result.get("items", [])
+
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                changes.sync_token = result.get("nextSyncToken")
+                return
+
+            result = get_page(page_token)
+
+    changes.events = events(result)
+    return changes
+
+
+def get_calendar_sync(calendar_id: str) -> CalendarSync:
+    """
+    Returns the sync state of ``calendar_id``, creating it if needed.
+    """
+    return session.query(CalendarSync).get(calendar_id) or CalendarSync(
+        calendar_id=calendar_id
+    )
+
+
+def watch_calendar(
+    address: str, token: Optional[str] = None, ttl: Optional[int] = None
+) -> CalendarSync:
+    """
+    Opens a channel that pushes a notification to ``address`` whenever the
+    calendar's events change.  Any previous channel is stopped once the new
+    one is open.
+
+    :param str address: The HTTPS URL Google should post notifications to
+    :param str token: Sent back with each notification to prove its origin
+    :param int ttl: The requested lifetime of the channel, in seconds
+    """
+    calendar_id = settings.calendar.name
+    service = get_calendar_service()
+
+    body = {
+        "id": str(uuid.uuid4()),
+        "type": "web_hook",
+        "address": address,
+        "params": {"ttl": str(ttl or settings.calendar.webhook_ttl)},
+    }
+    if token:
+        body["token"] = token
+
+    try:
+        channel = service.events().watch(calendarId=calendar_id, body=body).execute()
+    except HttpError as e:
+        _check_calendar_error(e, calendar_id)
+        raise
+
+    sync = get_calendar_sync(calendar_id)
+    old_channel = (sync.channel_id, sync.channel_resource_id)
+
+    sync.channel_id = channel["id"]
+    sync.channel_resource_id = channel["resourceId"]
+    sync.channel_expires_at = (
+        int(channel["expiration"]) // 1000 if channel.get("expiration") else None
+    )
+    session.add(sync)
+    session.commit()
+
+    if all(old_channel):
+        stop_channel(*old_channel)
+
+    return sync
+
+
+def unwatch_calendar():
+    """
+    Stops the calendar's notification channel, if it has one.
+    """
+    sync = session.query(CalendarSync).get(settings.calendar.name)
+    if not (sync and sync.channel_id):
+        return
+
+    stop_channel(sync.channel_id, sync.channel_resource_id)
+    sync.channel_id = sync.channel_resource_id = sync.channel_expires_at = None
+    session.commit()
+
+
+def stop_channel(channel_id: str, resource_id: str):
+    """
+    Stops a notification channel.  Failures are only logged; the channel
+    will expire on its own.
+    """
+    try:
+        get_calendar_service().channels().stop(
+            body={"id": channel_id, "resourceId": resource_id}
+        ).execute()
+    except HttpError as e:
+        logging.warning("GCAL: could not stop channel %s: %s", channel_id, e)
+
+
+def matches_filter(gcal_event: dict, q_filter: str = "nest") -> bool:
+    """
+    Returns `True` if ``gcal_event`` is an active event whose summary
+    contains ``q_filter``.  This is the client-side version of the ``q``
+    parameter used for incremental syncs.
+    """
+    if gcal_event.get("status") == "cancelled":
+        return False
+
+    return q_filter.lower() in gcal_event.get("summary", "").lower()
+
+
+def get_calendar_service():
+    """
+    Returns the Calendar API client.  It's built once per process from the
+    discovery document bundled with google-api-python-client (no network
+    fetch) and only rebuilt if the credentials change.
+    """
+    global _service, _service_credentials
+
+    # Building the client pulls in a lot; only import it when it's needed.
+    from googleapiclient import discovery
+
+    credentials = get_credentials(
+        name="calendar", oauth_token=settings.calendar.token_file
+    )
+
+    with _service_lock:
+        if (_service is None) or (_service_credentials is not credentials):
+            _service = discovery.build(
+                "calendar",
+                "v3",
+                credentials=credentials,
+                static_discovery=True,
+                cache_discovery=False,
+            )
+            _service_credentials = credentials
+
+        return _service
+
+
+def lookback_start() -> arrow.Arrow:
+    """
+    Returns the start of the window of events we care about.
+    """
+    lookback = settings.calendar.lookback
+    return (
+        arrow.now()
+        .replace(hour=0, minute=0, second=0, microsecond=0)
+        .shift(days=-1 * lookback)
+    )
+
+
+def lookahead_end() -> arrow.Arrow:
+    """
+    Returns the end of the window of events we care about.
+    """
+    return arrow.now().shift(days=settings.calendar.lookahead)
+
+
+def sync_window() -> Tuple[arrow.Arrow, arrow.Arrow]:
+    """
+    Returns the start and end of the window of events that are read from the
+    calendar and kept in sync with the cache.
+    """
+    return lookback_start(), lookahead_end()
+
+
+def _check_calendar_error(error: HttpError, calendar_id: str):
+    if error.resp["status"] == "404":
+        raise ValueError(
+            'Could not find your calendar: "%s".  Please check your settings!'
+            % calendar_id
+        )
 
 
 def purge_db():
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import datetime
+import logging
+import os
+import threading
 from pathlib import Path
-from typing import Optional, Sequence
+from typing import Dict, Optional, Sequence, Tuple
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 
 from .settings import settings
 
@@ -14,6 +17,34 @@ SCOPES = [
     "https://www.googleapis.com/auth/sdm.service",
 ]
 
+# Refresh tokens this long before they expire so nobody is handed a token
+# that's about to be rejected.
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+CacheKey = Tuple[str, Tuple[str, ...]]
+
+# Process-wide credentials, keyed by name and scopes.
+_cache: Dict[CacheKey, Credentials] = {}
+_timers: Dict[CacheKey, threading.Timer] = {}
+_lock = threading.RLock()
+
+
+def save_credentials(credentials: Credentials, access_token: Path) -> bool:
+    """
+    Writes the credentials to ``access_token`` if they've changed.  The file
+    is replaced atomically so a crash can't leave a truncated token behind.
+
+    Returns `True` if the file was written.
+    """
+    data = credentials.to_json()
+    if access_token.exists() and access_token.read_text() == data:
+        return False
+
+    tmp = access_token.with_name(f".{access_token.name}.tmp")
+    tmp.write_text(data)
+    os.replace(tmp, access_token)
+    return True
+
 
 def login(oauth_token: Path, access_token: Path, scopes: Sequence[str]) -> Credentials:
     credentials = None
@@ -28,9 +59,11 @@ def login(oauth_token: Path, access_token: Path, scopes: Sequence[str]) -> Crede
         credentials = Credentials.from_authorized_user_file(access_token, scopes)
 
     # If have expired credentials, refresh them.  Otherwise, re-run authorization.
-    if credentials and credentials.expired and credentials.refresh_token:
+    if credentials and credentials.refresh_token and expiring(credentials):
         credentials.refresh(Request())
     elif not credentials:
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
         flow = InstalledAppFlow.from_client_secrets_file(
             oauth_token,
             scopes,
@@ -38,18 +71,88 @@ def login(oauth_token: Path, access_token: Path, scopes: Sequence[str]) -> Crede
         credentials = flow.run_console()
 
     # Save the access token
-    access_token.write_text(credentials.to_json())
+    save_credentials(credentials, access_token)
 
     return credentials
 
 
+def expiring(credentials: Credentials) -> bool:
+    """
+    Returns `True` if the credentials have expired or will within
+    `REFRESH_MARGIN`.
+    """
+    if not credentials.expiry:
+        return False
+
+    return credentials.expiry - datetime.datetime.utcnow() < REFRESH_MARGIN
+
+
+def _refresh(key: CacheKey, credentials: Credentials, access_token: Path):
+    with _lock:
+        logging.debug("refreshing %s credentials", key[0])
+        credentials.refresh(Request())
+        save_credentials(credentials, access_token)
+        _schedule_refresh(key, credentials, access_token)
+
+
+def _background_refresh(key: CacheKey, credentials: Credentials, access_token: Path):
+    try:
+        _refresh(key, credentials, access_token)
+    except Exception as e:
+        # The next `get_credentials` call will try again in the foreground.
+        logging.warning("could not refresh %s credentials: %s", key[0], e)
+
+
+def _schedule_refresh(key: CacheKey, credentials: Credentials, access_token: Path):
+    """
+    Starts a daemon timer that refreshes the credentials shortly before they
+    expire.
+    """
+    with _lock:
+        timer = _timers.pop(key, None)
+        if timer:
+            timer.cancel()
+
+        if not (credentials.expiry and credentials.refresh_token):
+            return
+
+        delay = credentials.expiry - datetime.datetime.utcnow() - REFRESH_MARGIN
+        timer = threading.Timer(
+            max(delay.total_seconds(), 0),
+            _background_refresh,
+            args=(key, credentials, access_token),
+        )
+        timer.daemon = True
+        timer.start()
+        _timers[key] = timer
+
+
 def get_credentials(
     name: str,
     oauth_token: Path,
     access_token: Optional[Path] = None,
     scopes: Sequence[str] = SCOPES,
-):
+    force_refresh: bool = False,
+) -> Credentials:
+    """
+    Returns the credentials for ``name``.  They're read from disk once per
+    process and then served from memory, being refreshed in the background
+    before they expire.  Pass ``force_refresh`` if the API rejected the
+    current token.
+    """
     if not access_token:
         access_token = settings.general.token_folder / f"tmp-{name}-access-token.json"
 
-    return login(oauth_token, access_token, scopes)
+    key = (name, tuple(sorted(scopes)))
+
+    with _lock:
+        credentials = _cache.get(key)
+
+        if credentials is None:
+            credentials = login(oauth_token, access_token, scopes)
+            _cache[key] = credentials
+            _schedule_refresh(key, credentials, access_token)
+        elif credentials.refresh_token and (force_refresh or expiring(credentials)):
+            _refresh(key, credentials, access_token)
+
+    return credentials
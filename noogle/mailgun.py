@@ -9,6 +9,9 @@ from pydantic import SecretStr
 
 from .settings import settings
 
+# Reused between messages so the connection to Mailgun is kept alive.
+_session = requests.Session()
+
 
 def send_message(
     subject: str = "Notification from noogle",
@@ -18,6 +21,7 @@ def send_message(
     api_key: Optional[SecretStr] = None,
     to_address: str = None,
     from_address: str = None,
+    timeout: Optional[float] = None,
 ):
     if not (text or html):
         raise ValueError("Must pass both/either of `text` and `html`")
@@ -37,6 +41,11 @@ def send_message(
 
     auth = ("api", api_key.get_secret_value())
     mailgun_url = f"https://api.mailgun.net/v3/{domain}/messages"
-    response = requests.post(mailgun_url, auth=auth, data=data)
+    response = _session.post(
+        mailgun_url,
+        auth=auth,
+        data=data,
+        timeout=timeout or settings.mailgun.timeout,
+    )
     response.raise_for_status()
     return response
@@ -1,5 +1,19 @@
 import enum
-from sqlalchemy import Integer, String, Column, Enum, UniqueConstraint
+from typing import Optional
+
+from sqlalchemy import (
+    Column,
+    Enum,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    UniqueConstraint,
+    func,
+)
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import exists, and_
 from sqlalchemy_utils import ArrowType
 from sqlalchemy.exc import IntegrityError
@@ -7,7 +21,7 @@ from sqlalchemy.exc import IntegrityError
 from .db import Base, session
 import arrow
 from .settings import settings
-from .utils import get_scheduled_date
+from .utils import from_timestamp, get_scheduled_date, to_timestamp
 from .helpers import print_log
 
 
@@ -34,6 +48,8 @@ class Structure(Base):
     """Describes a Google structure."""
 
     __tablename__ = "structures"
+    __table_args__ = (Index("ix_structures_name", "name", unique=True),)
+
     id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
     name = Column(String, nullable=False)
     custom_name = Column(String, nullable=True)
@@ -42,27 +58,112 @@ class Structure(Base):
         return f"<Structure(custom_name={self.custom_name})>"
 
 
+# Structures are looked up by their case-folded name
+Index("ix_structures_custom_name_lower", func.lower(Structure.custom_name))
+
+
 class Thermostat(Base):
     """Describes a Nest thermostat."""
 
     __tablename__ = "thermostats"
+    __table_args__ = (
+        Index(
+            "ix_thermostats_name_structure_name",
+            "name",
+            "structure_name",
+            unique=True,
+        ),
+    )
+
     id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
     name = Column(String, nullable=False)
     label = Column(String, nullable=True)
     structure_name = Column(String, nullable=False)
 
+    # The last traits read from the API, and when (epoch seconds).
+    # ``fetched_at`` is 0 once a command makes them stale, and `None` if the
+    # thermostat wasn't in the last device list.
+    mode = Column(String, nullable=True)
+    eco = Column(String, nullable=True)
+    setpoint_c = Column(Float, nullable=True)
+    fetched_at = Column(Integer, nullable=True)
+
     def __repr__(self) -> str:
         return f"<Thermostat(label={self.label})>"
 
 
+class ConvergenceTime(Base):
+    """
+    How long the thermostats took to reach the state they were commanded
+    to; kept so short-lived processes can tune their convergence polling.
+    """
+
+    __tablename__ = "convergence_times"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
+    seconds = Column(Float, nullable=False)
+    # Epoch seconds
+    recorded_at = Column(Integer, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ConvergenceTime(seconds={self.seconds:.1f})>"
+
+
+class CalendarSync(Base):
+    """
+    Holds the incremental sync token and push-notification channel for a
+    Google calendar.
+    """
+
+    __tablename__ = "calendar_sync"
+    calendar_id = Column(String, primary_key=True, nullable=False)
+    sync_token = Column(String, nullable=True)
+    updated = Column(ArrowType, nullable=True)
+    channel_id = Column(String, nullable=True)
+    channel_resource_id = Column(String, nullable=True)
+    channel_expires_at = Column(Integer, nullable=True)
+    # The end of the window (epoch seconds) read when the sync token was
+    # issued.
+    window_end = Column(Integer, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<CalendarSync(calendar_id={self.calendar_id})>"
+
+
+class Outbox(Base):
+    """A notification waiting to be emailed."""
+
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_sent_at_next_attempt_at", "sent_at", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
+    subject = Column(String, nullable=False)
+    text = Column(String, nullable=False)
+
+    # Epoch seconds
+    created_at = Column(Integer, nullable=False)
+    next_attempt_at = Column(Integer, nullable=False)
+    sent_at = Column(Integer, nullable=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<Outbox(id={self.id}, subject={self.subject!r})>"
+
+
 class Event(Base):
     """Describes a single event stored in cache."""
 
     __tablename__ = "events"
     __table_args__ = (
         UniqueConstraint(
-            "event_id", "scheduled_date", "calendar_id", name="event_id__date__cal__uc"
+            "event_id", "scheduled_at", "calendar_id", name="event_id__date__cal__uc"
         ),
+        Index("ix_events_state_scheduled_at", "state", "scheduled_at"),
+        Index("ix_events_scheduled_at", "scheduled_at"),
         {"sqlite_autoincrement": True},
     )
 
@@ -73,8 +174,12 @@ class Event(Base):
     calendar_id = Column(String, default="primary")
     parent_event_id = Column(Integer, nullable=True)
     state = Column(Enum(State), nullable=False, default=State.waiting)
-    scheduled_date = Column(ArrowType, nullable=True)
-    actioned_date = Column(ArrowType, nullable=True)
+    # Dates are stored as seconds since the UTC epoch so they index, sort and
+    # compare as numbers; the original timezone is kept for display.
+    scheduled_at = Column(Integer, nullable=True)
+    scheduled_tz = Column(String, nullable=True)
+    actioned_at = Column(Integer, nullable=True)
+    actioned_tz = Column(String, nullable=True)
     description = Column(String, nullable=True)
     structure_name = Column(String, default="", nullable=False)
     structure_id = Column(String, default="", nullable=False)
@@ -85,11 +190,51 @@ class Event(Base):
     def __repr__(self):
         return str(self)
 
+    @property
+    def scheduled_date(self) -> Optional[arrow.Arrow]:
+        return from_timestamp(self.scheduled_at, self.scheduled_tz)
+
+    @scheduled_date.setter
+    def scheduled_date(self, value):
+        self.scheduled_at = to_timestamp(value)
+        self.scheduled_tz = arrow.get(value).format("ZZ") if value else None
+
+    @property
+    def actioned_date(self) -> Optional[arrow.Arrow]:
+        return from_timestamp(self.actioned_at, self.actioned_tz)
+
+    @actioned_date.setter
+    def actioned_date(self, value):
+        self.actioned_at = to_timestamp(value)
+        self.actioned_tz = arrow.get(value).format("ZZ") if value else None
+
     @staticmethod
     def waiting():
         """Return all waiting events"""
         return session.query(Event).filter(Event.state == State.waiting).all()
 
+    @staticmethod
+    def due(window_start, now=None):
+        """
+        Returns the waiting events scheduled between ``window_start`` and
+        ``now`` (default: the current time), oldest first.  The rows are
+        streamed as the query is iterated.
+        """
+        now = now or arrow.utcnow()
+
+        return (
+            session.query(Event)
+            .filter(
+                and_(
+                    Event.state == State.waiting,
+                    Event.scheduled_at >= to_timestamp(window_start),
+                    Event.scheduled_at <= to_timestamp(now),
+                )
+            )
+            .order_by(Event.scheduled_at)
+            .yield_per(100)
+        )
+
     @staticmethod
     def exists(event_id, scheduled_date, state=State.waiting):
         """Returns True if the event_id exists, False otherwise"""
@@ -97,7 +242,7 @@ class Event(Base):
             exists().where(
                 and_(
                     Event.event_id == event_id,
-                    Event.scheduled_date == scheduled_date,
+                    Event.scheduled_at == to_timestamp(scheduled_date),
                     Event.state == state,
                 )
             )
@@ -112,11 +257,10 @@ class Event(Base):
         e.actioned_date = None
 
         parts = e.name.split(":")
-        if len(parts) == 2:
-            e.action = Action[parts[1].strip()]
-        elif len(parts) == 3:
+        if len(parts) in [2, 3] and parts[1].strip() in Action.__members__:
             e.action = Action[parts[1].strip()]
-            e.description = parts[2].strip()
+            if len(parts) == 3:
+                e.description = parts[2].strip()
         else:
             print_log(f'WARNING: Cannot parse event name: "{e.name}"')
 
@@ -124,7 +268,7 @@ class Event(Base):
             # The user has an "all day" event in gcal.
             default_time = (
                 settings.calendar.default_home_time
-                if e.action.value == Action.home
+                if e.action == Action.home
                 else settings.calendar.default_away_time
             )
 
@@ -150,51 +294,90 @@ class Event(Base):
         return e
 
     @staticmethod
-    def events_missing(gcal_event_list):
-        result = []
+    def events_missing(gcal_keys, window_start, window_end):
+        """
+        Returns the waiting events scheduled between ``window_start`` and
+        ``window_end`` that aren't in ``gcal_keys``, the ``(event_id,
+        scheduled_at)`` pairs of the calendar's events in that window; either
+        they were removed from the calendar or moved to another date.
+
+        The pairs are loaded into a temporary table and anti-joined against
+        ``events``, so this is a single query no matter how many events there
+        are.
+        """
+        rows = [
+            {"event_id": event_id, "scheduled_at": scheduled_at}
+            for event_id, scheduled_at in gcal_keys
+        ]
+        waiting = and_(
+            Event.state == State.waiting,
+            Event.scheduled_at >= to_timestamp(window_start),
+            Event.scheduled_at <= to_timestamp(window_end),
+        )
 
         # If there are no events returned, return all waiting events.
-        if not gcal_event_list:
-            return session.query(Event).filter(Event.state == State.waiting).all()
+        if not rows:
+            return session.query(Event).filter(waiting).all()
+
+        gcal_events = Table(
+            "gcal_events",
+            MetaData(),
+            Column("event_id", String, nullable=False),
+            Column("scheduled_at", Integer, nullable=False),
+            prefixes=["TEMPORARY"],
+        )
+
+        # A call that failed before dropping the table leaves it behind in an
+        # open transaction; its rows are stale, so start over.
+        connection = session.connection()
+        gcal_events.drop(connection, checkfirst=True)
+        gcal_events.create(connection)
 
-        for gcal_event in gcal_event_list:
-            scheduled_date = get_scheduled_date(gcal_event)
+        try:
+            connection.execute(gcal_events.insert(), rows)
 
-            events = (
+            return (
                 session.query(Event)
-                .filter(
+                .outerjoin(
+                    gcal_events,
                     and_(
-                        Event.event_id == gcal_event["id"], Event.state == State.waiting
-                    )
+                        gcal_events.c.event_id == Event.event_id,
+                        gcal_events.c.scheduled_at == Event.scheduled_at,
+                    ),
                 )
+                .filter(and_(waiting, gcal_events.c.event_id.is_(None)))
                 .all()
             )
+        finally:
+            gcal_events.drop(connection)
+
+    def transition(self, state, from_state=State.waiting, commit=True) -> bool:
+        """
+        Moves the event from ``from_state`` to ``state``.  The calendar and
+        Nest services run in their own threads, so this is a conditional
+        ``UPDATE`` rather than a write of whatever state we loaded; if the
+        other one got there first, the event is left alone.
+
+        Returns `True` if the event was moved.
+        """
+        updated = (
+            session.query(Event)
+            .filter(Event.id == self.id, Event.state == from_state)
+            .update({"state": state}, synchronize_session=False)
+        )
+        if updated:
+            set_committed_value(self, "state", state)
 
-            if not events:
-                continue
-
-            result += [x for x in events if x.scheduled_date != scheduled_date]
-
-        # Ensure that future events cached in the DB show up in the list from google
-        gcal_ids = [x["id"] for x in gcal_event_list]
-        removed_events = (
-            session.query(Event).filter(
-                and_(Event.state == State.waiting, Event.event_id.notin_(gcal_ids))
-            )
-        ).all()
-        result += removed_events
+        if commit:
+            session.commit()
 
-        return result
+        return bool(updated)
 
-    def mark_event_missing(self):
-        self.state = State.removed
-        session.add(self)
-        session.commit()
+    def mark_event_missing(self) -> bool:
+        return self.transition(State.removed)
 
-    def mark_event_done(self):
-        self.state = State.complete
-        session.add(self)
-        session.commit()
+    def mark_event_done(self) -> bool:
+        return self.transition(State.complete)
 
     def commit(self):
         try:
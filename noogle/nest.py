@@ -1,26 +1,32 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-This module has the class used to control the Nest thermostat.
+This module has the classes used to control the Nest thermostat.
 """
 
 # Imports #####################################################################
+import asyncio
+import dataclasses
 import json
 import logging
 import operator
 import re
 import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
 
-import requests
+import httpx
+from sqlalchemy import func
 
-from .db import session
+from .db import session, upsert
 from .google_auth import get_credentials
 from .helpers import print_log
 from .models import Action
+from .models import ConvergenceTime as ConvergenceTimeModel
 from .models import Structure as StructureModel
 from .models import Thermostat as ThermostatModel
+from .ratelimit import RateLimiter
 from .settings import settings
 from .utils import celsius_to_fahrenheit, fahrenheit_to_celsius, is_winter
 
@@ -56,6 +62,22 @@ class RateLimitExceeded(APIError):
         return f"<RateLimitExceeded: {self.response.text}"
 
 
+class CommandError(Exception):
+    """
+    Exception if a command failed for one or more thermostats
+    """
+
+    def __init__(self, errors: Dict[str, Exception]):
+        super().__init__()
+        self.errors = errors
+
+    def __str__(self):
+        return "\n".join(f"{label}: {error}" for label, error in self.errors.items())
+
+    def __repr__(self):
+        return f"<CommandError: {', '.join(self.errors)}>"
+
+
 @dataclass(frozen=False)
 class ThermostatInDB:
     name: str
@@ -79,28 +101,137 @@ class Structure:
     custom_name: str
 
 
-class NestAPI:
+class AsyncNestAPI:
+    """
+    An asyncio client for the Smart Device Management API.
+
+    Use ``await AsyncNestAPI.create()`` (or ``async with AsyncNestAPI() as
+    api``) to get a loaded instance.
+    """
+
     base_api_url = "https://smartdevicemanagement.googleapis.com/v1/"
-    verification_wait = 30
 
-    def __init__(self, load=True):
-        creds = get_credentials(name="nest", oauth_token=settings.nest.token_file)
-        self.token = creds.token
+    # Recently observed convergence times (seconds); used to tune the first
+    # poll in `wait_for_convergence`.  They're kept in the database along
+    # with the snapshot, so `--once` processes tune themselves too.
+    _convergence_times: Deque[float] = deque(maxlen=20)
+
+    # Redirect targets keyed by the requested URL; shared by all instances so
+    # each service cycle doesn't have to re-learn them.
+    _redirects: Dict[str, str] = {}
+
+    # Per-enterprise and per-device SDM quotas; created on first use.
+    _enterprise_limiter: Optional[RateLimiter] = None
+    _device_limiter: Optional[RateLimiter] = None
+
+    # The last known traits of every thermostat and when they were read
+    # (epoch seconds), keyed by thermostat name.  A fetch time of 0 marks an
+    # entry made stale by a command.
+    _snapshot: Dict[str, Tuple[float, Thermostat]] = {}
+
+    def __init__(self):
+        # The cached credentials are refreshed in place, so always read the
+        # token from them rather than keeping a copy.
+        self._credentials = get_credentials(
+            name="nest", oauth_token=settings.nest.token_file
+        )
+
+        self._client = self._create_client()
 
         self.thermostats: Dict[str, Thermostat] = {}
         self.structures: Dict[str, Structure] = {}
 
+        # The target state of every thermostat we've sent a command to, keyed
+        # by thermostat name; cleared once the thermostats report it.
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+        # Limits the number of in-flight commands per structure; created
+        # lazily so they belong to the running event loop.
+        self._structure_semaphores: Dict[str, asyncio.Semaphore] = {}
+
         self.__loaded = False
 
+    @classmethod
+    async def create(cls, load: bool = True) -> "AsyncNestAPI":
+        api = cls()
         if load:
-            self.load()
+            await api.load()
+        return api
+
+    async def __aenter__(self) -> "AsyncNestAPI":
+        await self.load()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @staticmethod
+    def _create_client() -> httpx.AsyncClient:
+        """
+        Creates the keep-alive client used for all SDM requests.
+        """
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.nest.pool_size,
+                max_keepalive_connections=settings.nest.pool_size,
+            ),
+            timeout=httpx.Timeout(
+                settings.nest.read_timeout, connect=settings.nest.connect_timeout
+            ),
+            follow_redirects=False,
+        )
+
+    async def close(self):
+        """
+        Closes the pooled HTTP connections.
+        """
+        await self._client.aclose()
 
     def _format_url(self, partial: str):
-        return f"{NestAPI.base_api_url}{partial}"
+        return f"{AsyncNestAPI.base_api_url}{partial}"
+
+    @classmethod
+    async def _rate_limit(cls, url: str) -> float:
+        """
+        Waits until the SDM quota for ``url`` allows another call.  Device
+        URLs are limited per device (commands and reads separately);
+        everything else per enterprise.
+        """
+        if cls._enterprise_limiter is None:
+            cls._enterprise_limiter = RateLimiter(
+                settings.nest.enterprise_requests_per_minute,
+                settings.nest.rate_limit_burst,
+            )
+            cls._device_limiter = RateLimiter(
+                settings.nest.device_requests_per_minute,
+                settings.nest.rate_limit_burst,
+            )
+
+        match = re.search(r"(enterprises/[^/:]+)(/devices/[^/:]+)?", url)
+        if match and match.group(2):
+            kind = "command" if url.endswith(":executeCommand") else "read"
+            delay = cls._device_limiter.reserve((match.group(0), kind))
+        else:
+            key = match.group(1) if match else url
+            delay = cls._enterprise_limiter.reserve(key)
 
-    def _get_token(self):
-        creds = get_credentials(name="nest", oauth_token=settings.nest.token_file)
-        self.token = creds.token
+        if delay:
+            logging.debug("rate limited %.1fs for '%s'", delay, url)
+            await asyncio.sleep(delay)
+
+        return delay
+
+    @property
+    def token(self) -> str:
+        return self._credentials.token
+
+    async def _get_token(self):
+        self._credentials = await asyncio.to_thread(
+            get_credentials,
+            name="nest",
+            oauth_token=settings.nest.token_file,
+            force_refresh=True,
+        )
 
     def _get_structures_from_db(self):
         structures = {}
@@ -110,11 +241,11 @@ class NestAPI:
             )
         return structures
 
-    def _get_structures_from_api(self) -> Dict[str, Structure]:
+    async def _get_structures_from_api(self) -> Dict[str, Structure]:
         logging.info("Reading structures from the Nest API")
         structures = {}
 
-        data = self.request(
+        data = await self.request(
             "get",
             url=self._format_url(
                 f"enterprises/{settings.nest.product_id.get_secret_value()}/structures"
@@ -137,11 +268,16 @@ class NestAPI:
                 name=name,
                 custom_name=custom_name,
             )
-            model = StructureModel(name=name, custom_name=custom_name)
-            session.add(model)
-
             structures[name] = structure
 
+        upsert(
+            StructureModel,
+            [
+                {"name": s.name, "custom_name": s.custom_name}
+                for s in structures.values()
+            ],
+            index_elements=["name"],
+        )
         session.commit()
         return structures
 
@@ -155,9 +291,52 @@ class NestAPI:
             )
         return thermostats
 
-    def _get_thermostats_from_api(self):
+    @staticmethod
+    def _parse_thermostat(item: dict) -> Thermostat:
+        """
+        Converts a device resource from the API into a `Thermostat`.
+        """
+        name = item["name"]
+        label = (
+            item.get("traits", {}).get("sdm.devices.traits.Info", {}).get("customName")
+        ) or ""
+
+        if not label:
+            raise ValueError("No custom label set for thermostat")
+
+        mode = item["traits"]["sdm.devices.traits.ThermostatMode"]["mode"]
+        eco = item["traits"]["sdm.devices.traits.ThermostatEco"]["mode"]
+        setpoint_c = (
+            item["traits"]["sdm.devices.traits.ThermostatTemperatureSetpoint"].get(
+                "heatCelsius"
+            )
+            or 0.0
+        )
+
+        parent_id = item["parentRelations"][0]["parent"]
+        structure_name = re.search(
+            "(?P<structure>.*/structures/.*?)/room", parent_id
+        ).group(1)
+
+        return Thermostat(
+            name=name,
+            label=label,
+            mode=mode,
+            eco=eco,
+            setpoint_c=setpoint_c,
+            structure_name=structure_name,
+        )
+
+    async def _get_thermostat_from_api(self, name: str) -> Thermostat:
+        """
+        Reads a single thermostat from the API.
+        """
+        data = await self.request("get", self._format_url(name))
+        return self._parse_thermostat(data)
+
+    async def _get_thermostats_from_api(self):
         thermostats = {}
-        data = self.request(
+        data = await self.request(
             "get",
             url=self._format_url(
                 f"enterprises/{settings.nest.product_id.get_secret_value()}/devices"
@@ -169,57 +348,199 @@ class NestAPI:
             raise KeyError("Invalid data returned; no devices found.")
 
         for item in data["devices"]:
-            name = item["name"]
-            label = (
-                item.get("traits", {})
-                .get("sdm.devices.traits.Info", {})
-                .get("customName")
-            ) or ""
-
-            if not label:
-                raise ValueError("No custom label set for thermostat")
-            elif label in thermostats:
-                raise ValueError(f"Multiple thermostats found labeled: '{label}'")
-
-            mode = item["traits"]["sdm.devices.traits.ThermostatMode"]["mode"]
-            eco = item["traits"]["sdm.devices.traits.ThermostatEco"]["mode"]
-            setpoint_c = (
-                item["traits"]["sdm.devices.traits.ThermostatTemperatureSetpoint"].get(
-                    "heatCelsius"
+            thermostat = self._parse_thermostat(item)
+
+            if thermostat.label in thermostats:
+                raise ValueError(
+                    f"Multiple thermostats found labeled: '{thermostat.label}'"
                 )
-                or 0.0
-            )
 
-            parent_id = item["parentRelations"][0]["parent"]
-            structure_name = re.search(
-                "(?P<structure>.*/structures/.*?)/room", parent_id
-            ).group(1)
+            thermostats[thermostat.label] = thermostat
 
-            thermostats[label] = Thermostat(
-                name=name,
-                label=label,
-                mode=mode,
-                eco=eco,
-                setpoint_c=setpoint_c,
-                structure_name=structure_name,
+        self._store_snapshot(thermostats.values())
+        return thermostats
+
+    @staticmethod
+    def _snapshot_row(thermostat: Thermostat, fetched_at: Optional[float]) -> dict:
+        row = {
+            "name": thermostat.name,
+            "label": thermostat.label,
+            "structure_name": thermostat.structure_name,
+        }
+
+        if settings.nest.persist_snapshot:
+            row.update(
+                mode=thermostat.mode,
+                eco=thermostat.eco,
+                setpoint_c=thermostat.setpoint_c,
+                fetched_at=None if fetched_at is None else int(fetched_at),
             )
 
-            if (
-                not session.query(ThermostatModel)
-                .filter_by(name=name, structure_name=structure_name)
-                .count()
-            ):
-                thermostat = ThermostatModel(
-                    name=name, label=label, structure_name=structure_name
-                )
-                session.add(thermostat)
+        return row
+
+    def _store_snapshot(self, thermostats: Iterable[Thermostat]):
+        """
+        Replaces the snapshot with a full device list.
+        """
+        now = time.time()
+        thermostats = list(thermostats)
+        AsyncNestAPI._snapshot = {t.name: (now, t) for t in thermostats}
+
+        upsert(
+            ThermostatModel,
+            [self._snapshot_row(t, now) for t in thermostats],
+            index_elements=["name", "structure_name"],
+        )
+
+        if settings.nest.persist_snapshot:
+            # Devices that have gone away mustn't hold the snapshot open.
+            session.query(ThermostatModel).filter(
+                ThermostatModel.name.notin_([t.name for t in thermostats])
+            ).update({ThermostatModel.fetched_at: None}, synchronize_session=False)
 
         session.commit()
-        return thermostats
 
-    def load(self, force=False):
+    @classmethod
+    def _update_snapshot(
+        cls, thermostats: Iterable[Thermostat], fetched_at: Optional[float] = None
+    ):
+        """
+        Updates the snapshot entries of ``thermostats`` in place.  Pass a
+        ``fetched_at`` of 0 to mark them stale.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        thermostats = list(thermostats)
+
+        for thermostat in thermostats:
+            cls._snapshot[thermostat.name] = (fetched_at, thermostat)
+
+        if settings.nest.persist_snapshot and thermostats:
+            upsert(
+                ThermostatModel,
+                [cls._snapshot_row(t, fetched_at) for t in thermostats],
+                index_elements=["name", "structure_name"],
+            )
+            session.commit()
+
+    @staticmethod
+    def _get_snapshot_from_db() -> Dict[str, Tuple[float, Thermostat]]:
+        snapshot = {}
+        query = session.query(ThermostatModel).filter(
+            ThermostatModel.fetched_at.isnot(None)
+        )
+
+        for row in query:
+            snapshot[row.name] = (
+                row.fetched_at,
+                Thermostat(
+                    name=row.name,
+                    label=row.label,
+                    structure_name=row.structure_name,
+                    mode=row.mode,
+                    eco=row.eco,
+                    setpoint_c=row.setpoint_c or 0.0,
+                ),
+            )
+
+        return snapshot
+
+    @staticmethod
+    def _snapshot_fresh(snapshot: Dict[str, Tuple[float, Thermostat]]) -> bool:
+        if not snapshot:
+            return False
+
+        oldest = min(fetched_at for fetched_at, _ in snapshot.values())
+        return time.time() - oldest < settings.nest.snapshot_ttl
+
+    @classmethod
+    def _get_thermostats_from_snapshot(cls) -> Optional[Dict[str, Thermostat]]:
+        """
+        Returns the thermostats keyed by label if every entry in the snapshot
+        was read within ``settings.nest.snapshot_ttl`` seconds; otherwise
+        `None`.  If the in-memory snapshot isn't fresh it's re-read from the
+        database, where another process (e.g. ``service events``) may have
+        updated it.
         """
-        Reads the data structures from the API.
+        if not cls._snapshot_fresh(cls._snapshot) and settings.nest.persist_snapshot:
+            AsyncNestAPI._snapshot = cls._get_snapshot_from_db()
+
+        if not cls._snapshot_fresh(cls._snapshot):
+            return None
+
+        return {t.label: t for _, t in cls._snapshot.values()}
+
+    @staticmethod
+    def _merge_traits(thermostat: Thermostat, traits: dict) -> Thermostat:
+        """
+        Returns ``thermostat`` with the (partial) ``traits`` of a device
+        resource applied.
+        """
+        changes: Dict[str, Any] = {}
+
+        label = traits.get("sdm.devices.traits.Info", {}).get("customName")
+        if label:
+            changes["label"] = label
+
+        mode = traits.get("sdm.devices.traits.ThermostatMode", {}).get("mode")
+        if mode:
+            changes["mode"] = mode
+
+        eco = traits.get("sdm.devices.traits.ThermostatEco", {}).get("mode")
+        if eco:
+            changes["eco"] = eco
+
+        setpoint = traits.get("sdm.devices.traits.ThermostatTemperatureSetpoint")
+        if setpoint is not None:
+            changes["setpoint_c"] = setpoint.get("heatCelsius") or 0.0
+
+        return dataclasses.replace(thermostat, **changes)
+
+    @classmethod
+    def apply_traits(cls, name: str, traits: dict) -> Optional[Thermostat]:
+        """
+        Applies a trait update pushed for device ``name`` to the snapshot
+        (and the database), marking the entry fresh.
+
+        Returns the updated thermostat, or `None` if the device isn't in the
+        snapshot.
+        """
+        if (name not in cls._snapshot) and settings.nest.persist_snapshot:
+            AsyncNestAPI._snapshot = cls._get_snapshot_from_db()
+
+        if name not in cls._snapshot:
+            logging.debug("ignoring traits for unknown device '%s'", name)
+            return None
+
+        thermostat = cls._merge_traits(cls._snapshot[name][1], traits)
+        cls._update_snapshot([thermostat])
+        return thermostat
+
+    @classmethod
+    def touch_snapshot(cls):
+        """
+        Marks every current entry in the snapshot as just read.  Only call
+        this while something is pushing device changes into the snapshot;
+        entries made stale by a command are left alone.
+        """
+        now = time.time()
+        cls._snapshot.update(
+            {
+                name: (now, thermostat)
+                for name, (fetched_at, thermostat) in cls._snapshot.items()
+                if fetched_at
+            }
+        )
+
+        if settings.nest.persist_snapshot:
+            session.query(ThermostatModel).filter(
+                ThermostatModel.fetched_at > 0
+            ).update({ThermostatModel.fetched_at: int(now)}, synchronize_session=False)
+            session.commit()
+
+    async def load(self, force=False):
+        """
+        Reads the data structures.  The thermostats come from the snapshot if
+        it's fresh; pass ``force`` to always list them from the API.
         """
         if self.__loaded and not force:
             return
@@ -228,10 +549,16 @@ class NestAPI:
 
         self.structures = self._get_structures_from_db()
         if not self.structures:
-            self.structures = self._get_structures_from_api()
+            self.structures = await self._get_structures_from_api()
         logging.debug("found %s structures", len(self.structures))
 
-        self.thermostats = self._get_thermostats_from_api()
+        thermostats = None if force else self._get_thermostats_from_snapshot()
+        if thermostats is None:
+            thermostats = await self._get_thermostats_from_api()
+        else:
+            logging.debug("using the thermostat snapshot")
+
+        self.thermostats = thermostats
         logging.debug("found %s thermostats", len(self.thermostats))
 
         self.__loaded = True
@@ -239,7 +566,7 @@ class NestAPI:
     def _get_structure_by_name(self, custom_name):
         model = (
             session.query(StructureModel)
-            .filter(StructureModel.custom_name.ilike(custom_name))
+            .filter(func.lower(StructureModel.custom_name) == custom_name.lower())
             .first()
         )
 
@@ -262,7 +589,7 @@ class NestAPI:
 
         return thermostats
 
-    def request(
+    async def request(
         self,
         method: str,
         url: str,
@@ -273,37 +600,40 @@ class NestAPI:
             raise ValueError(f"Unsupported method: {method}")
 
         try:
-            return self._request(method=method, url=url, payload=payload)
+            return await self._request(method=method, url=url, payload=payload)
         except Unauthorized:
             if request_auth:
-                self._get_token()
-                return self._request(method=method, url=url, payload=payload)
+                await self._get_token()
+                return await self._request(method=method, url=url, payload=payload)
             else:
                 raise
 
-    def _request(
-        self, method: str, url: str, payload: Optional[dict] = None, wait: float = 10.0
-    ):
+    async def _request(self, method: str, url: str, payload: Optional[dict] = None):
         auth = "Bearer ".encode("ascii") + self.token.encode("ascii", "ignore")
         headers = {"authorization": auth, "content-type": "application/json"}
 
         if payload and not isinstance(payload, dict):
             raise TypeError(f"Type of payload must be dict; was: {type(payload)}")
-        elif payload:
-            payload = json.dumps(payload)
 
-        response = requests.request(
-            method, url=url, headers=headers, data=payload, allow_redirects=False
-        )
+        data = json.dumps(payload) if payload else None
+
+        await self._rate_limit(url)
+
+        # SDM redirects device/enterprise URLs to a fixed target; reuse the
+        # last one we saw so we don't pay for the 307 on every call.
+        target = self._redirects.get(url, url)
+        response = await self._send(method, target, headers, data)
 
         if response.status_code == 307:  # indicates a redirect is needed
-            response = requests.request(
-                method=method,
-                url=response.headers["Location"],
-                headers=headers,
-                data=payload,
-                allow_redirects=False,
-            )
+            target = response.headers["Location"]
+            self._redirects[url] = target
+            response = await self._send(method, target, headers, data)
+        elif response.status_code in (404, 410) and target != url:
+            # The cached target may have gone stale; forget it and try the
+            # original URL again.
+            logging.debug("dropping cached redirect for '%s'", url)
+            self._redirects.pop(url, None)
+            return await self._request(method=method, url=url, payload=payload)
 
         if response.status_code == 401:
             raise Unauthorized(response)
@@ -315,16 +645,19 @@ class NestAPI:
         response.raise_for_status()
 
         logging.debug("url: '%s'; code: %s", url, response.status_code)
-        logging.debug("sleeping %ss", wait)
-        time.sleep(wait)
         return response.json()
 
-    def show(self):
+    async def _send(self, method: str, url: str, headers: dict, data: Optional[str]):
+        return await self._client.request(
+            method, url=url, headers=headers, content=data
+        )
+
+    async def show(self):
         """
         Displays some information about the structure and thermostat using
         the NestAPI.
         """
-        self.load()
+        await self.load()
 
         for label, thermostat in self.thermostats.items():
             print(label)
@@ -338,21 +671,192 @@ class NestAPI:
                 else int(celsius_to_fahrenheit(thermostat.setpoint_c)),
             )
 
-    def set_temperature(self, structure, temp_f: int, comparison=operator.ne):
+    def _expect(self, thermostat: Thermostat, **target):
+        """
+        Records the state we expect ``thermostat`` to converge to.
+        """
+        self._pending.setdefault(thermostat.name, {}).update(target)
+
+    @staticmethod
+    def _converged(thermostat: Thermostat, target: Dict[str, Any]) -> bool:
+        for key, value in target.items():
+            current = getattr(thermostat, key)
+            if key == "setpoint_c":
+                if abs(current - value) >= 0.5:
+                    return False
+            elif current != value:
+                return False
+
+        return True
+
+    @classmethod
+    def _initial_convergence_delay(cls) -> float:
+        """
+        Returns how long to wait before the first convergence poll.  This
+        starts at the configured value and tracks the observed convergence
+        times so we don't poll long before the thermostats are likely done.
+        """
+        if not cls._convergence_times and settings.nest.persist_snapshot:
+            rows = (
+                session.query(ConvergenceTimeModel.seconds)
+                .order_by(ConvergenceTimeModel.id.desc())
+                .limit(cls._convergence_times.maxlen)
+                .all()
+            )
+            cls._convergence_times.extend(seconds for seconds, in reversed(rows))
+
+        if not cls._convergence_times:
+            return settings.nest.convergence_initial_delay
+
+        times = sorted(cls._convergence_times)
+        median = times[len(times) // 2]
+        return max(0.5, min(median / 2, settings.nest.convergence_max_delay))
+
+    @classmethod
+    def _record_convergence(cls, elapsed: float):
+        cls._convergence_times.append(elapsed)
+
+        if settings.nest.persist_snapshot:
+            session.add(
+                ConvergenceTimeModel(seconds=elapsed, recorded_at=int(time.time()))
+            )
+
+            # Only keep as many as we'd use.
+            oldest_kept = (
+                session.query(ConvergenceTimeModel.id)
+                .order_by(ConvergenceTimeModel.id.desc())
+                .offset(cls._convergence_times.maxlen - 1)
+                .limit(1)
+                .scalar()
+            )
+            if oldest_kept:
+                session.query(ConvergenceTimeModel).filter(
+                    ConvergenceTimeModel.id < oldest_kept
+                ).delete(synchronize_session=False)
+
+            session.commit()
+
+    async def wait_for_convergence(self, timeout: Optional[float] = None) -> float:
+        """
+        Polls the thermostats we've sent commands to until they all report
+        the requested state.  Only the commanded thermostats are read, with
+        exponential backoff between polls.
+
+        Returns the number of seconds it took; raises an `Exception` if the
+        thermostats don't converge within ``timeout`` seconds.
+        """
+        pending = dict(self._pending)
+        self._pending.clear()
+
+        if not pending:
+            return 0.0
+
+        timeout = timeout or settings.nest.convergence_timeout
+        start = time.monotonic()
+        delay = self._initial_convergence_delay()
+
+        while True:
+            remaining = timeout - (time.monotonic() - start)
+            await asyncio.sleep(max(0.0, min(delay, remaining)))
+
+            thermostats = await asyncio.gather(
+                *(self._get_thermostat_from_api(name) for name in pending)
+            )
+            self._update_snapshot(thermostats)
+            for thermostat in thermostats:
+                self.thermostats[thermostat.label] = thermostat
+
+                if self._converged(thermostat, pending[thermostat.name]):
+                    del pending[thermostat.name]
+
+            elapsed = time.monotonic() - start
+            if not pending:
+                self._record_convergence(elapsed)
+                return elapsed
+            elif elapsed >= timeout:
+                labels = ", ".join(
+                    t.label for t in self.thermostats.values() if t.name in pending
+                )
+                raise Exception(
+                    f"Thermostats did not converge within {timeout}s: {labels}"
+                )
+
+            delay = min(delay * 2, settings.nest.convergence_max_delay)
+
+    def _structure_semaphore(self, structure: Structure) -> asyncio.Semaphore:
+        if structure.name not in self._structure_semaphores:
+            self._structure_semaphores[structure.name] = asyncio.Semaphore(
+                settings.nest.max_concurrent_commands
+            )
+        return self._structure_semaphores[structure.name]
+
+    async def _execute_commands(
+        self,
+        structure: Structure,
+        commands: Dict[Thermostat, Tuple[dict, Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Sends ``executeCommand`` to each thermostat concurrently.
+
+        ``commands`` maps each thermostat to its command payload and the state
+        we expect it to converge to.  No more than
+        ``settings.nest.max_concurrent_commands`` commands are in flight for
+        a structure at once.  Every command is allowed to finish; if any of
+        them failed, a `CommandError` is raised with the per-thermostat
+        errors and nothing is left pending convergence.
+
+        Returns the API results keyed by thermostat label.
+        """
+        semaphore = self._structure_semaphore(structure)
+
+        async def send(thermostat: Thermostat, payload: dict):
+            url = self._format_url(f"{thermostat.name}:executeCommand")
+            async with semaphore:
+                return await self.request("post", url, payload)
+
+        thermostats = list(commands)
+        responses = await asyncio.gather(
+            *(send(t, commands[t][0]) for t in thermostats), return_exceptions=True
+        )
+
+        # Whatever happened, the snapshot of these thermostats can't be
+        # trusted until they're read again.
+        self._update_snapshot(thermostats, fetched_at=0)
+
+        results: Dict[str, Any] = {}
+        errors: Dict[str, Exception] = {}
+        for thermostat, response in zip(thermostats, responses):
+            if isinstance(response, Exception):
+                logging.error("command failed for '%s': %s", thermostat.label, response)
+                errors[thermostat.label] = response
+            else:
+                results[thermostat.label] = response
+                self._expect(thermostat, **commands[thermostat][1])
+
+        if errors:
+            # The action has failed; don't leave the targets of the commands
+            # that went through for a later action to wait on.
+            self._pending.clear()
+            raise CommandError(errors)
+
+        return results
+
+    async def set_temperature(self, structure, temp_f: int, comparison=operator.ne):
         temp_c = round(fahrenheit_to_celsius(temp_f), 0)
 
         thermostats = self._get_structure_thermostats(structure)
         bad_thermostats = [t for t in thermostats if comparison(t.setpoint_c, temp_c)]
 
-        for thermostat in bad_thermostats:
-            payload = {
-                "command": "sdm.devices.commands.ThermostatTemperatureSetpoint.SetHeat",
-                "params": {"heatCelsius": temp_c},
-            }
-            url = self._format_url(f"{thermostat.name}:executeCommand")
-            self.request("post", url, payload)
+        payload = {
+            "command": "sdm.devices.commands.ThermostatTemperatureSetpoint.SetHeat",
+            "params": {"heatCelsius": temp_c},
+        }
+        await self._execute_commands(
+            structure,
+            {t: (payload, {"setpoint_c": temp_c}) for t in bad_thermostats},
+        )
 
-    def set_eco(
+    async def set_eco(
         self, structure: Structure, mode: str = "MANUAL_ECO", force: bool = False
     ):
         if mode.upper() not in ["OFF", "MANUAL_ECO"]:
@@ -375,15 +879,19 @@ class NestAPI:
         if not bad_thermostats:
             bad_thermostats = t_map
 
+        commands = {}
         for t, mode in bad_thermostats.items():
             payload = {
                 "command": "sdm.devices.commands.ThermostatEco.SetMode",
                 "params": {"mode": mode},
             }
-            url = self._format_url(f"{t.name}:executeCommand")
-            self.request("post", url, payload)
+            commands[t] = (payload, {"eco": mode})
 
-    def set_hvac_mode(self, structure: Structure, hvac_mode: str, force: bool = False):
+        await self._execute_commands(structure, commands)
+
+    async def set_hvac_mode(
+        self, structure: Structure, hvac_mode: str, force: bool = False
+    ):
         """
         Sets the Thermostat mode for all thermostats in a structure.  The only
         supported values are:
@@ -412,19 +920,21 @@ class NestAPI:
         if not bad_thermostats:
             bad_thermostats = t_map
 
+        commands = {}
         for t, mode in bad_thermostats.items():
             payload = {
                 "command": "sdm.devices.commands.ThermostatMode.SetMode",
                 "params": {"mode": mode},
             }
-            url = self._format_url(f"{t.name}:executeCommand")
-            self.request("post", url, payload)
+            commands[t] = (payload, {"mode": mode})
 
-    def do_away(self):
+        await self._execute_commands(structure, commands)
+
+    async def do_away(self):
         """
         Sets up the thermostat in eco mode.
         """
-        self.load()
+        await self.load()
 
         structure_name = settings.nest.structure.lower()
         structure = self._get_structure_by_name(structure_name)
@@ -432,13 +942,13 @@ class NestAPI:
         if not structure:
             raise ValueError(f"Could not find structure in API: {structure_name}")
 
-        self.set_eco(structure, "MANUAL_ECO")
+        await self.set_eco(structure, "MANUAL_ECO")
 
-    def do_home(self):
+    async def do_home(self):
         """
         Sets up the thermostat in *home* mode.
         """
-        self.load()
+        await self.load()
 
         structure_name = settings.nest.structure
         structure = self._get_structure_by_name(structure_name)
@@ -449,19 +959,19 @@ class NestAPI:
         if is_winter():
             temp_f = settings.nest.winter_home_min_temp
 
-            self.set_eco(structure, mode="OFF")
-            self.set_hvac_mode(structure, "HEAT")
-            self.set_temperature(structure, temp_f, comparison=operator.lt)
+            await self.set_eco(structure, mode="OFF")
+            await self.set_hvac_mode(structure, "HEAT")
+            await self.set_temperature(structure, temp_f, comparison=operator.lt)
         else:
-            self.set_hvac_mode(structure, "HEATCOOL")
+            await self.set_hvac_mode(structure, "HEATCOOL")
 
-    def verify(self, action, force_load=True):
+    async def verify(self, action, force_load=True):
         """
         Verify the action actually occurred.
         """
         errors = []
 
-        self.load(force=force_load)
+        await self.load(force=force_load)
         structure_name = settings.nest.structure.lower()
         structure = self._get_structure_by_name(structure_name)
 
@@ -485,19 +995,24 @@ class NestAPI:
             message = "\n".join(errors)
             raise Exception(message)
 
-    def change_needed(self, action):
+    async def change_needed(self, action):
         """
         Returns `True` if the current state does not match the requested
         action.
         """
         try:
-            self.verify(action, force_load=False)
+            await self.verify(action, force_load=False)
             return False
         except Exception:
             return True
 
-    def do_action(self, action):
-        if not self.change_needed(action):
+    async def do_action(self, action, timeout: Optional[float] = None):
+        """
+        Puts the thermostats into the state for ``action`` and waits up to
+        ``timeout`` seconds (default: ``settings.nest.convergence_timeout``)
+        for them to report it.
+        """
+        if not await self.change_needed(action):
             print_log("No action needed")
             return
 
@@ -505,20 +1020,116 @@ class NestAPI:
 
         func = action_map.get(action.value, None)
         if func:
-            func()
+            await func()
 
-            print_log(f"...waiting {NestAPI.verification_wait}s before verification")
-            time.sleep(NestAPI.verification_wait)
+            print_log("...waiting for the thermostats to converge")
+            elapsed = await self.wait_for_convergence(timeout=timeout)
+            print_log(f"...converged in {elapsed:.1f}s")
 
-            self.verify(action)
+            # The commanded thermostats were just refreshed; no need to
+            # re-list every device.
+            await self.verify(action, force_load=False)
         else:
             raise Exception("Unknown action: {!r}".format(action))
 
         print_log("...OK")
 
 
+class NestAPI:
+    """
+    Blocking wrapper around `AsyncNestAPI`.  Each instance runs its own event
+    loop so the pooled connections are reused between calls; use it as a
+    context manager (or call `close`) to release them.
+    """
+
+    def __init__(self, load=True):
+        self._loop = asyncio.new_event_loop()
+        self._api = AsyncNestAPI()
+
+        if load:
+            try:
+                self.load()
+            except BaseException:
+                self.close()
+                raise
+
+    def __enter__(self) -> "NestAPI":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run(self, coro):
+        return self._loop.run_until_complete(coro)
+
+    @property
+    def thermostats(self) -> Dict[str, Thermostat]:
+        return self._api.thermostats
+
+    @property
+    def structures(self) -> Dict[str, Structure]:
+        return self._api.structures
+
+    def close(self):
+        """
+        Closes the pooled HTTP connections and the event loop.
+        """
+        if not self._loop.is_closed():
+            self._run(self._api.close())
+            self._loop.close()
+
+    def load(self, force=False):
+        return self._run(self._api.load(force=force))
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        payload: Optional[dict] = None,
+        request_auth: bool = True,
+    ):
+        return self._run(
+            self._api.request(method, url, payload=payload, request_auth=request_auth)
+        )
+
+    def show(self):
+        return self._run(self._api.show())
+
+    def set_temperature(self, structure, temp_f: int, comparison=operator.ne):
+        return self._run(self._api.set_temperature(structure, temp_f, comparison))
+
+    def set_eco(
+        self, structure: Structure, mode: str = "MANUAL_ECO", force: bool = False
+    ):
+        return self._run(self._api.set_eco(structure, mode=mode, force=force))
+
+    def set_hvac_mode(self, structure: Structure, hvac_mode: str, force: bool = False):
+        return self._run(self._api.set_hvac_mode(structure, hvac_mode, force=force))
+
+    def do_away(self):
+        return self._run(self._api.do_away())
+
+    def do_home(self):
+        return self._run(self._api.do_home())
+
+    def wait_for_convergence(self, timeout: Optional[float] = None) -> float:
+        return self._run(self._api.wait_for_convergence(timeout=timeout))
+
+    def verify(self, action, force_load=True):
+        return self._run(self._api.verify(action, force_load=force_load))
+
+    def change_needed(self, action):
+        return self._run(self._api.change_needed(action))
+
+    def do_action(self, action, timeout: Optional[float] = None):
+        return self._run(self._api.do_action(action, timeout=timeout))
+
+
 def purge_db():
     """Removes Structures and Thermostats from the database"""
+    AsyncNestAPI._snapshot = {}
+    AsyncNestAPI._convergence_times.clear()
+    session.query(ConvergenceTimeModel).delete()
     session.query(ThermostatModel).delete()
     session.query(StructureModel).delete()
     session.commit()
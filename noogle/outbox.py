@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module holds the notification outbox.  The services only append to it;
+a background sender emails the notifications, retrying with backoff and
+optionally coalescing them into one digest per window.
+"""
+# Imports #####################################################################
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import and_
+
+from .db import session
+from .mailgun import send_message
+from .models import Outbox
+from .settings import settings
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+# Globals #####################################################################
+# How long a sender may hold the notifications it's sending before another
+# process is allowed to try them.
+LEASE = 5 * 60
+
+# The longest the sender sleeps when it's not told about new notifications
+# (e.g. they were added by another process).
+IDLE_POLL = 60.0
+
+_added = threading.Event()
+
+
+def enqueue(subject: str, text: str) -> Outbox:
+    """
+    Adds a notification to the outbox.
+    """
+    now = int(time.time())
+    notification = Outbox(
+        subject=subject, text=text, created_at=now, next_attempt_at=now, attempts=0
+    )
+    session.add(notification)
+    session.commit()
+
+    _added.set()
+    return notification
+
+
+def retry_delay(attempts: int) -> int:
+    """
+    Returns how long to wait before the next try after ``attempts`` failures.
+    """
+    delay = settings.mailgun.retry_initial_delay * 2 ** (attempts - 1)
+    return min(delay, settings.mailgun.retry_max_delay)
+
+
+def _pending(now: int) -> List[Outbox]:
+    return (
+        session.query(Outbox)
+        .filter(
+            and_(
+                Outbox.sent_at.is_(None),
+                Outbox.next_attempt_at <= now,
+                Outbox.attempts < settings.mailgun.max_attempts,
+            )
+        )
+        .order_by(Outbox.created_at)
+        .all()
+    )
+
+
+def _claim(notifications: List[Outbox], now: int) -> bool:
+    """
+    Leases ``notifications`` so no other sender picks them up.  Returns
+    `False` if another sender got to any of them first.
+    """
+    ids = [n.id for n in notifications]
+    claimed = (
+        session.query(Outbox)
+        .filter(Outbox.id.in_(ids), Outbox.next_attempt_at <= now)
+        .update({Outbox.next_attempt_at: now + LEASE}, synchronize_session=False)
+    )
+
+    if claimed != len(ids):
+        session.rollback()
+        return False
+
+    session.commit()
+    return True
+
+
+def _format(notifications: List[Outbox]):
+    if len(notifications) == 1:
+        return notifications[0].subject, notifications[0].text
+
+    subject = f"{len(notifications)} notifications from noogle"
+    text = "\n\n".join(
+        f"{n.subject}\n{'-' * len(n.subject)}\n{n.text}" for n in notifications
+    )
+    return subject, text
+
+
+def flush(now: Optional[int] = None, digest_window: Optional[int] = None) -> int:
+    """
+    Sends the notifications that are due.  With a ``digest_window`` (default:
+    ``settings.mailgun.digest_window``) they're sent as one email once the
+    oldest has waited that many seconds; otherwise each one is sent as it's
+    added.
+
+    Returns the number of notifications sent.
+    """
+    now = now or int(time.time())
+    if digest_window is None:
+        digest_window = settings.mailgun.digest_window
+
+    notifications = _pending(now)
+    if not notifications:
+        return 0
+
+    if digest_window and (notifications[0].created_at > now - digest_window):
+        session.commit()
+        return 0
+
+    batches = [notifications] if digest_window else [[n] for n in notifications]
+    sent = 0
+
+    for batch in batches:
+        if not _claim(batch, now):
+            continue
+
+        subject, text = _format(batch)
+        try:
+            send_message(subject=subject, text=text)
+        except Exception as e:
+            logging.warning("could not send '%s': %s", subject, e)
+            for notification in batch:
+                notification.attempts += 1
+                notification.last_error = str(e)
+                notification.next_attempt_at = now + retry_delay(notification.attempts)
+
+                if notification.attempts >= settings.mailgun.max_attempts:
+                    logging.error("giving up on %r", notification)
+        else:
+            for notification in batch:
+                notification.sent_at = now
+            sent += len(batch)
+
+        session.commit()
+
+    return sent
+
+
+def next_due() -> Optional[int]:
+    """
+    Returns when the sender next has something to do (epoch seconds).
+    """
+    pending = (
+        session.query(Outbox.created_at, Outbox.next_attempt_at)
+        .filter(
+            Outbox.sent_at.is_(None),
+            Outbox.attempts < settings.mailgun.max_attempts,
+        )
+        .order_by(Outbox.next_attempt_at)
+        .first()
+    )
+    session.commit()
+
+    if not pending:
+        return None
+
+    created_at, next_attempt_at = pending
+    return max(next_attempt_at, created_at + settings.mailgun.digest_window)
+
+
+class Sender(threading.Thread):
+    """
+    Sends the outbox in the background.  It wakes up when a notification is
+    added in this process, when a retry or digest is due, and at least every
+    `IDLE_POLL` seconds.
+    """
+
+    def __init__(self):
+        super().__init__(name="outbox", daemon=True)
+        self.stopped = threading.Event()
+
+    def stop(self, flush_pending: bool = True):
+        """
+        Stops the sender, first sending whatever is due if ``flush_pending``.
+        """
+        self.stopped.set()
+        _added.set()
+        self.join()
+
+        if flush_pending:
+            flush()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                flush()
+                due = next_due()
+            except Exception:
+                logging.exception("outbox: could not send notifications")
+                session.rollback()
+                due = None
+            finally:
+                session.remove()
+
+            delay = IDLE_POLL if due is None else due - time.time()
+            _added.wait(min(max(delay, 0), IDLE_POLL))
+            _added.clear()
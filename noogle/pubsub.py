@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module consumes the Smart Device Management events that Google pushes
+through Cloud Pub/Sub, and applies the trait updates to the thermostat
+snapshot.
+"""
+# Imports #####################################################################
+import abc
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+import arrow
+
+from .nest import AsyncNestAPI, Thermostat
+from .settings import settings
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+# Globals #####################################################################
+# The timestamp of the last update applied for each (device, trait), so
+# redelivered or out-of-order messages don't roll the state back.
+_trait_times: Dict[Tuple[str, str], arrow.Arrow] = {}
+
+
+class Subscriber(abc.ABC):
+    """
+    A source of SDM event messages.
+
+    `messages` yields each message as a dict.  It should also yield `None`
+    every so often when there's nothing to read so the consumer can do its
+    housekeeping.  A message has been handled once the consumer asks for the
+    next one, so that's when it should be acknowledged; messages that can't
+    be decoded are logged and skipped.
+    """
+
+    @abc.abstractmethod
+    def messages(self) -> Iterator[Optional[dict]]:
+        ...
+
+    def close(self):
+        pass
+
+
+class FileSubscriber(Subscriber):
+    """
+    Reads one JSON message per line from a file.  This stands in for Pub/Sub
+    when testing.  With ``follow``, it keeps waiting for new lines like
+    ``tail -f``.
+    """
+
+    def __init__(self, path: Path, follow: bool = False, poll: float = 1.0):
+        self.path = path
+        self.follow = follow
+        self.poll = poll
+
+    def messages(self) -> Iterator[Optional[dict]]:
+        with open(self.path) as fh:
+            while True:
+                line = fh.readline()
+
+                if line.strip():
+                    message = _decode(line)
+                    if message is not None:
+                        yield message
+                elif line:
+                    continue
+                elif self.follow:
+                    time.sleep(self.poll)
+                    yield None
+                else:
+                    return
+
+
+class PubSubSubscriber(Subscriber):
+    """
+    Pulls messages from a Cloud Pub/Sub subscription.  Each message is
+    acknowledged once it's been handled (or dropped, if it can't be decoded);
+    if the consumer stops first, Pub/Sub delivers the rest again.  Set
+    ``PUBSUB_EMULATOR_HOST`` to use the local Pub/Sub emulator.
+    """
+
+    def __init__(self, subscription: str, max_messages: int = 100):
+        try:
+            from google.cloud import pubsub_v1
+        except ImportError:
+            raise ImportError(
+                "google-cloud-pubsub is required; install noogle[pubsub]"
+            ) from None
+
+        self.subscription = subscription
+        self.max_messages = max_messages
+        self._client = pubsub_v1.SubscriberClient()
+
+    def messages(self) -> Iterator[Optional[dict]]:
+        from google.api_core.exceptions import DeadlineExceeded
+
+        while True:
+            try:
+                response = self._client.pull(
+                    request={
+                        "subscription": self.subscription,
+                        "max_messages": self.max_messages,
+                    },
+                    timeout=30,
+                )
+            except DeadlineExceeded:
+                yield None
+                continue
+
+            if not response.received_messages:
+                yield None
+                continue
+
+            for received in response.received_messages:
+                message = _decode(received.message.data)
+                if message is not None:
+                    yield message
+
+                self._client.acknowledge(
+                    request={
+                        "subscription": self.subscription,
+                        "ack_ids": [received.ack_id],
+                    }
+                )
+
+    def close(self):
+        self._client.close()
+
+
+def _decode(data) -> Optional[dict]:
+    """
+    Returns the message in ``data`` (JSON), or `None` if it isn't one.
+    """
+    try:
+        message = json.loads(data)
+    except ValueError as e:
+        logging.warning("EVENTS: dropping a message that isn't JSON: %s", e)
+        return None
+
+    if not isinstance(message, dict):
+        logging.warning("EVENTS: dropping a message that isn't an object")
+        return None
+
+    return message
+
+
+def apply_event(message: dict) -> Optional[Thermostat]:
+    """
+    Applies the trait updates in an SDM event to the thermostat snapshot.
+
+    Returns the updated thermostat, or `None` if the message wasn't a
+    thermostat trait update (or was older than what we already have).
+    """
+    update = message.get("resourceUpdate", {})
+    name = update.get("name", "")
+    traits = update.get("traits")
+
+    if "/devices/" not in name or not traits:
+        return None
+
+    timestamp = arrow.get(message["timestamp"]) if "timestamp" in message else None
+    if timestamp:
+        traits = {
+            trait: value
+            for trait, value in traits.items()
+            if not _trait_times.get((name, trait), timestamp) > timestamp
+        }
+
+        if not traits:
+            logging.debug("ignoring stale event %s", message.get("eventId"))
+            return None
+
+        for trait in traits:
+            _trait_times[(name, trait)] = timestamp
+
+    return AsyncNestAPI.apply_traits(name, traits)
+
+
+def consume(subscriber: Subscriber) -> int:
+    """
+    Applies every message from ``subscriber`` until it runs out.
+
+    While messages are being received, the snapshot is known to be current,
+    so its entries are kept fresh even when nothing changes.  That lets
+    `NestAPI.load` serve them instead of listing devices.
+
+    A message that can't be applied is logged and skipped, so one bad event
+    doesn't stop the rest.
+
+    Returns the number of thermostat updates applied.
+    """
+    applied = 0
+    touched = time.monotonic()
+
+    try:
+        for message in subscriber.messages():
+            if message is not None:
+                try:
+                    thermostat = apply_event(message)
+                except Exception:
+                    logging.exception(
+                        "EVENTS: could not apply event %s", message.get("eventId")
+                    )
+                    thermostat = None
+
+                if thermostat:
+                    applied += 1
+                    logging.info(
+                        "EVENTS: %s is %s/%s at %.1fC",
+                        thermostat.label,
+                        thermostat.mode,
+                        thermostat.eco,
+                        thermostat.setpoint_c,
+                    )
+
+            if time.monotonic() - touched >= settings.nest.snapshot_ttl / 2:
+                AsyncNestAPI.touch_snapshot()
+                touched = time.monotonic()
+    finally:
+        subscriber.close()
+
+    return applied
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This module holds a simple token-bucket rate limiter.
+"""
+# Imports #####################################################################
+import threading
+import time
+from typing import Dict, Hashable
+
+
+class TokenBucket:
+    """
+    A token bucket that refills at ``rate`` tokens per second up to
+    ``capacity`` tokens.
+
+    Callers *reserve* a token and are told how long to wait before using it;
+    the bucket is allowed to go negative so that concurrent callers queue up
+    behind each other instead of all waking at the same time.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive; was: {rate}")
+
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns the number of seconds to wait before the
+        caller may proceed.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    """
+    A collection of token buckets, one per key.
+    """
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key: Hashable) -> TokenBucket:
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.rate, self.burst)
+            return self._buckets[key]
+
+    def reserve(self, key: Hashable) -> float:
+        """
+        Returns the number of seconds to wait before making a call for
+        ``key``.
+        """
+        return self.bucket(key).reserve()
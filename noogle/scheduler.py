@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module holds the scheduler that runs cached events when they're due,
+and the periodic tasks used by the services.
+"""
+# Imports #####################################################################
+import heapq
+import logging
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from .db import session
+from .models import Event, State
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+# Globals #####################################################################
+# Never sleep longer than this in one go.  The wait is measured on the
+# monotonic clock, so this bounds how late we notice a wall-clock change
+# (e.g. after a suspend).  Waking up doesn't touch the database.
+MAX_SLEEP = 60.0
+
+# Events missed by more than this (e.g. the service was down) are skipped.
+CATCH_UP = 2 * 24 * 60 * 60
+
+# How long to back off after the scheduler hits an unexpected error.
+ERROR_DELAY = 30.0
+
+
+class Scheduler:
+    """
+    Keeps a min-heap of the waiting events' scheduled times and sleeps until
+    the earliest one, then dispatches the events that are due.
+
+    The heap is rebuilt from the database every ``resync`` seconds, or right
+    away after `wake` (e.g. when the calendar changed).  Deadlines are
+    absolute epoch times, so they don't drift however long each dispatch
+    takes, and anything missed within `CATCH_UP` runs as soon as it's seen.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[List[Event]], None],
+        resync: float = 300,
+        catch_up: float = CATCH_UP,
+    ):
+        self.dispatch = dispatch
+        self.resync = resync
+        self.catch_up = catch_up
+
+        self._heap: List[Tuple[int, int]] = []
+        self._wake = threading.Event()
+        self._next_resync = 0.0
+
+    def wake(self):
+        """
+        Makes the scheduler re-read the events.  Safe to call from any
+        thread.
+        """
+        self._wake.set()
+
+    def reload(self):
+        """
+        Rebuilds the heap from the waiting events.
+        """
+        since = int(time.time() - self.catch_up)
+        rows = session.query(Event.scheduled_at, Event.id).filter(
+            Event.state == State.waiting, Event.scheduled_at >= since
+        )
+
+        self._heap = [(scheduled_at, id_) for scheduled_at, id_ in rows]
+        heapq.heapify(self._heap)
+
+        # Don't hold the connection (and its transaction) while we sleep.
+        session.commit()
+        self._next_resync = time.monotonic() + self.resync
+
+        logging.debug("scheduler: %d events waiting", len(self._heap))
+
+    @property
+    def next_deadline(self) -> Optional[int]:
+        """
+        The epoch time of the next event, if any.
+        """
+        return self._heap[0][0] if self._heap else None
+
+    def run_due(self) -> int:
+        """
+        Dispatches the events that are due.  Returns how many there were.
+        """
+        now = time.time()
+        ids = []
+        while self._heap and self._heap[0][0] <= now:
+            ids.append(heapq.heappop(self._heap)[1])
+
+        if not ids:
+            return 0
+
+        # The state may have changed since the heap was built.
+        events = (
+            session.query(Event)
+            .filter(Event.id.in_(ids), Event.state == State.waiting)
+            .order_by(Event.scheduled_at)
+            .all()
+        )
+
+        if events:
+            self.dispatch(events)
+
+        session.commit()
+        return len(events)
+
+    def run(self, until: Optional[float] = None):
+        """
+        Dispatches events as they come due, forever or until the epoch time
+        ``until``.
+        """
+        self.reload()
+
+        while True:
+            try:
+                self.run_due()
+            except Exception:
+                # Keep running; the events are still waiting and will be
+                # picked up again by the next resync.
+                logging.exception("scheduler: dispatch failed")
+                session.rollback()
+                self._next_resync = min(
+                    self._next_resync, time.monotonic() + ERROR_DELAY
+                )
+
+            now = time.time()
+            if (until is not None) and (now >= until):
+                return
+
+            deadlines = [now + MAX_SLEEP, now + self._next_resync - time.monotonic()]
+            if self.next_deadline is not None:
+                deadlines.append(self.next_deadline)
+            if until is not None:
+                deadlines.append(until)
+
+            woken = self._wake.wait(max(min(deadlines) - now, 0))
+            if woken or (time.monotonic() >= self._next_resync):
+                self._wake.clear()
+                try:
+                    self.reload()
+                except Exception:
+                    logging.exception("scheduler: could not read the events")
+                    session.rollback()
+                    self._next_resync = time.monotonic() + ERROR_DELAY
+
+
+class PeriodicTask(threading.Thread):
+    """
+    Calls ``func`` every ``interval`` seconds in a background thread.
+
+    Each call runs in its own worker thread (with its own database session)
+    so one that hangs past ``timeout`` seconds is reported and abandoned
+    rather than blocking anything else; the next call waits until it has
+    finished.  Exceptions are logged and don't stop the task.
+
+    ``wait`` is called with the seconds left until the next call and may
+    return early (e.g. `CalendarWebhook.wait`); it defaults to sleeping.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval: float,
+        timeout: Optional[float] = None,
+        wait: Optional[Callable[[float], Any]] = None,
+    ):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.stopped = threading.Event()
+        self._wait = wait or self.stopped.wait
+        self._worker: Optional[threading.Thread] = None
+
+    def stop(self):
+        self.stopped.set()
+
+    def _call(self):
+        try:
+            self.func()
+        except Exception:
+            logging.exception("%s: failed", self.name)
+        finally:
+            session.remove()
+
+    def run(self):
+        next_run = time.monotonic()
+
+        while not self.stopped.is_set():
+            if self._worker and self._worker.is_alive():
+                logging.warning("%s: still busy; skipping this run", self.name)
+            else:
+                self._worker = threading.Thread(
+                    target=self._call, name=f"{self.name}-worker", daemon=True
+                )
+                self._worker.start()
+                self._worker.join(self.timeout)
+
+                if self._worker.is_alive():
+                    logging.error(
+                        "%s: gave up waiting after %ss", self.name, self.timeout
+                    )
+
+            # Keep to the original cadence however long the call took (or if
+            # `wait` returned early).
+            now = time.monotonic()
+            while next_run <= now:
+                next_run += self.interval
+
+            self._wait(next_run - now)
@@ -26,6 +26,19 @@ class Nest(BaseModel):
     thermostat: Optional[str]
     winter_home_min_temp: int = 65
     token_file: FilePath
+    pool_size: int = 10
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    enterprise_requests_per_minute: float = 10.0
+    device_requests_per_minute: float = 5.0
+    rate_limit_burst: int = 3
+    max_concurrent_commands: int = 4
+    convergence_timeout: float = 120.0
+    convergence_initial_delay: float = 2.0
+    convergence_max_delay: float = 15.0
+    snapshot_ttl: float = 60.0
+    persist_snapshot: bool = True
+    subscription: Optional[str] = None
 
 
 class Calendar(BaseModel):
@@ -33,8 +46,16 @@ class Calendar(BaseModel):
     default_home_time: time = time(hour=9)
     default_away_time: time = time(hour=19)
     lookback: int = 2
+    lookahead: int = 30
+    page_size: int = 50
     timezone: str = "MST"
     token_file: FilePath
+    incremental_sync: bool = False
+    webhook_address: Optional[str] = None
+    webhook_host: str = "127.0.0.1"
+    webhook_port: int = 8080
+    webhook_token: Optional[SecretStr] = None
+    webhook_ttl: int = 7 * 24 * 60 * 60
 
 
 class General(BaseModel):
@@ -48,6 +69,11 @@ class Mailgun(BaseModel):
     domain_name: str
     from_address: str
     to_address: str
+    timeout: float = 10.0
+    digest_window: int = 0
+    max_attempts: int = 10
+    retry_initial_delay: int = 60
+    retry_max_delay: int = 60 * 60
 
 
 class Database(BaseModel):
@@ -90,6 +116,60 @@ class Settings(BaseSettings):
         env_nested_delimiter = "__"
 
 
-CUSTOM_ENV = os.environ.get("NOOGLE_ENV", ".env")
-settings: Settings = Settings(_env_file=CUSTOM_ENV)
-DEBUG = settings.general.debug
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    """
+    Returns the application settings, reading them from the environment (and
+    the file named by ``$NOOGLE_ENV``, default ``.env``) the first time.
+    """
+    global _settings
+
+    if _settings is None:
+        _settings = Settings(_env_file=os.environ.get("NOOGLE_ENV", ".env"))
+
+    return _settings
+
+
+def configure(settings: Optional[Settings] = None, **values: Any) -> Settings:
+    """
+    Replaces the application settings; useful for tests and for embedding
+    noogle.  Pass a `Settings` object, or the values to build one from (and
+    optionally ``_env_file``).
+    """
+    global _settings
+
+    if settings is None:
+        values.setdefault("_env_file", None)
+        settings = Settings(**values)
+
+    _settings = settings
+    return _settings
+
+
+class _SettingsProxy:
+    """
+    Stands in for the `Settings` object so modules can ``from .settings
+    import settings`` without reading the settings at import time.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(get_settings(), name, value)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
+
+settings: Settings = _SettingsProxy()  # type: ignore
+
+
+def __getattr__(name: str) -> Any:
+    # Kept for compatibility; prefer ``settings.general.debug``.
+    if name == "DEBUG":
+        return get_settings().general.debug
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
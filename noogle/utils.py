@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 
 import arrow
 
@@ -20,6 +21,27 @@ def get_scheduled_date(gcal_event):
     return arrow.get(gcal_event["start"].get("dateTime"))
 
 
+def to_timestamp(date) -> Optional[int]:
+    """
+    Returns ``date`` as whole seconds since the UTC epoch.
+    """
+    if date is None:
+        return None
+
+    return arrow.get(date).int_timestamp
+
+
+def from_timestamp(timestamp: Optional[int], tz: Optional[str] = None):
+    """
+    Returns an `Arrow` object for a UTC epoch ``timestamp`` in the timezone
+    ``tz`` (UTC if not given).
+    """
+    if timestamp is None:
+        return None
+
+    return arrow.get(timestamp).to(tz or "UTC")
+
+
 def is_winter(date: arrow.Arrow = arrow.now()) -> bool:
     """
     Returns `True` if the date is considered winter.
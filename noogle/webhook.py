@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module holds the receiver for Google Calendar push notifications.
+"""
+# Imports #####################################################################
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Set
+
+from .gcal import unwatch_calendar, watch_calendar
+from .settings import settings
+
+# Metadata ####################################################################
+__author__ = "Timothy McFadden"
+__creationDate__ = "18-OCT-2026"
+
+# Globals #####################################################################
+# Renew the channel this long before it expires.
+RENEW_MARGIN = 60 * 60
+
+# How long to wait before retrying a failed renewal; also the shortest time
+# between renewals, in case the channel doesn't outlive `RENEW_MARGIN`.
+RENEW_RETRY = 5 * 60
+
+# Changes usually arrive in bursts; wait this long after a notification so
+# one sync picks them all up.
+DEBOUNCE = 2.0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def do_POST(self):
+        webhook = self.server.webhook
+        channel_id = self.headers.get("X-Goog-Channel-ID")
+        state = self.headers.get("X-Goog-Resource-State")
+
+        if not webhook.accepts(channel_id, self.headers.get("X-Goog-Channel-Token")):
+            logging.warning("GCAL: rejected notification for channel %s", channel_id)
+            self.send_response(403)
+        else:
+            logging.debug("GCAL: notification '%s' on channel %s", state, channel_id)
+
+            # "sync" is only sent when a channel opens.
+            if state != "sync":
+                webhook.notify()
+
+            self.send_response(200)
+
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logging.debug("GCAL: webhook %s", format % args)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, webhook: "CalendarWebhook"):
+        super().__init__(address, _Handler)
+        self.webhook = webhook
+
+
+class CalendarWebhook:
+    """
+    Listens for Calendar push notifications and keeps the watch channel
+    open.
+
+    Google only posts to a public HTTPS ``address``; put this behind a
+    reverse proxy or tunnel that forwards to ``host``:``port``.
+    """
+
+    def __init__(
+        self,
+        address: Optional[str] = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        token: Optional[str] = None,
+    ):
+        self.address = address or settings.calendar.webhook_address
+        if not self.address:
+            raise ValueError("calendar.webhook_address must be set to use webhooks")
+
+        self.host = host or settings.calendar.webhook_host
+        self.port = port or settings.calendar.webhook_port
+
+        if (token is None) and settings.calendar.webhook_token:
+            token = settings.calendar.webhook_token.get_secret_value()
+        self.token = token
+
+        self.expires_at: Optional[int] = None
+        self._channel_ids: Set[str] = set()
+        self._notified = threading.Event()
+        self._next_renewal = 0.0
+        self._server: Optional[_Server] = None
+
+    def start(self):
+        """
+        Starts the HTTP listener, then opens the watch channel.  The listener
+        has to be up first, as Google posts a "sync" notification to a new
+        channel straight away; it's shut down again if the channel can't be
+        opened.
+        """
+        self._server = _Server((self.host, self.port), self)
+        threading.Thread(
+            target=self._server.serve_forever, name="gcal-webhook", daemon=True
+        ).start()
+        logging.info("GCAL: listening for notifications on %s:%s", self.host, self.port)
+
+        try:
+            self.renew(force=True)
+        except BaseException:
+            self._stop_server()
+            raise
+
+    def stop(self):
+        """
+        Stops the watch channel and the HTTP listener.
+        """
+        unwatch_calendar()
+        self._stop_server()
+
+    def _stop_server(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def accepts(self, channel_id: Optional[str], token: Optional[str]) -> bool:
+        if channel_id not in self._channel_ids:
+            return False
+
+        return (not self.token) or (token == self.token)
+
+    def notify(self):
+        self._notified.set()
+
+    def renew(self, force: bool = False):
+        """
+        Replaces the watch channel if it expires within `RENEW_MARGIN`, but
+        no more often than every `RENEW_RETRY`.
+        """
+        if not (force or (time.time() >= self._next_renewal)):
+            return
+
+        sync = watch_calendar(self.address, token=self.token)
+
+        # Notifications for the old channel may still be in flight.
+        self._channel_ids.add(sync.channel_id)
+        self.expires_at = sync.channel_expires_at
+        self._next_renewal = (
+            max(self.expires_at - RENEW_MARGIN, time.time() + RENEW_RETRY)
+            if self.expires_at
+            else float("inf")
+        )
+
+        logging.info("GCAL: watching calendar on channel %s", sync.channel_id)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits up to ``timeout`` seconds for a notification, renewing the
+        channel as needed.
+
+        Returns `True` if a notification arrived.
+        """
+        deadline = time.monotonic() + timeout
+
+        while True:
+            try:
+                self.renew()
+            except Exception as e:
+                # Keep going; the polling safety net still catches changes.
+                logging.warning("GCAL: could not renew the watch channel: %s", e)
+                self._next_renewal = time.time() + RENEW_RETRY
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            until_renewal = max(self._next_renewal - time.time(), 0)
+            if self._notified.wait(min(remaining, until_renewal)):
+                time.sleep(DEBOUNCE)
+                self._notified.clear()
+                return True